@@ -0,0 +1,355 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from models import Stock
+from metrics import registry
+from store import ticker_key, parse_date, replace_file
+
+INDEX_FILE = "index.json"
+SEGMENT_PREFIX = "past-"
+UNDATED = "undated"
+
+registry.describe("rsa_archive_segment_loads_total", "counter", "Archive segments read from disk")
+registry.describe("rsa_archive_segment_load_seconds", "histogram", "Time to read one archive segment")
+
+def segment_period(name):
+    if name.startswith(SEGMENT_PREFIX) and name.endswith(".json"):
+        return name[len(SEGMENT_PREFIX):-len(".json")]
+    return None
+
+# An archive written while it was turned on, even one whose index is gone
+def archive_exists(directory):
+    return os.path.isdir(directory) and any(name == INDEX_FILE or segment_period(name) is not None for name in os.listdir(directory))
+
+def position(records, record):
+    return next(index for index, existing in enumerate(records) if existing is record)
+
+def identity(record):
+    return (ticker_key(record), record.date, record.source)
+
+def record_key(record):
+    return json.dumps(record.to_dict(), sort_keys=True)
+
+# Confirmed plays, kept out of stocks.json in one file per month (or year) of
+# split date plus a small index of ticker -> segments. Startup reads only the
+# index; a lookup reads the segments holding that ticker and the most recently
+# used ones stay in memory. Segment files are never edited in place, a change
+# writes the whole segment to a new file that replaces the old one.
+class Archive:
+    def __init__(self, directory, period="month", max_loaded=8, pin_seconds=10):
+        self.directory = directory
+        self.period = period
+        self.max_loaded = max_loaded
+        # Segments used this recently stay loaded past max_loaded, a command
+        # may still hold one of their records across an await; see locate()
+        self.pin_seconds = pin_seconds
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.tickers = {}
+        self.loaded = OrderedDict()
+        self.used = {}
+        self.owner = {}
+        self.dirty = set()
+        self.index_dirty = False
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index = None
+        try:
+            with open(self.index_path, 'r') as file:
+                index = json.load(file)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError as e:
+            logging.error(f"{self.index_path} could not be read ({e}), rebuilding it from the segments.")
+        if index is None or index.get('period') != self.period:
+            self.rebuild()
+            return
+        self.counts = index['segments']
+        self.tickers = index['tickers']
+        # Segments written after the index (a crash in between) are indexed again
+        index_time = os.path.getmtime(self.index_path)
+        for name in os.listdir(self.directory):
+            period = segment_period(name)
+            if period is not None and os.path.getmtime(os.path.join(self.directory, name)) > index_time:
+                logging.warning(f"Archive segment {name} is newer than the index, indexing it again.")
+                self.forget(period)
+                records = self.read(period, indexed=False)
+                if records:
+                    self.index_segment(period, records)
+                self.index_dirty = True
+        if self.index_dirty:
+            self.write(self.prepare())
+
+    # Reads every segment, e.g. when the index is missing or the period changed
+    def rebuild(self):
+        names = [name for name in sorted(os.listdir(self.directory)) if segment_period(name) is not None]
+        segments = {}
+        for name in names:
+            for record in self.read_file(os.path.join(self.directory, name)) or []:
+                segments.setdefault(self.period_of(record), []).append(record)
+        self.counts = {}
+        self.tickers = {}
+        for period, records in segments.items():
+            self.index_segment(period, records)
+        texts = {period: self.dump(records) for period, records in segments.items()}
+        texts.update({segment_period(name): None for name in names if segment_period(name) not in segments})
+        self.write((texts, self.index_text()))
+        if names:
+            logging.info(f"Rebuilt the archive index from {len(names)} segments.")
+
+    def period_of(self, record):
+        split_date = parse_date(record.date)
+        if split_date is None:
+            return UNDATED
+        if self.period == "year":
+            return str(split_date.year)
+        return f"{split_date.year}-{split_date.month:02}"
+
+    def segment_path(self, period):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{period}.json")
+
+    def files(self):
+        return [self.index_path] + [self.segment_path(period) for period in self.counts]
+
+    def count(self):
+        return sum(self.counts.values())
+
+    def ticker_list(self):
+        return list(self.tickers)
+
+    def index_segment(self, period, records):
+        self.counts[period] = len(records)
+        for ticker in {ticker_key(record) for record in records}:
+            periods = self.tickers.setdefault(ticker, [])
+            if period not in periods:
+                bisect.insort(periods, period)
+
+    def forget(self, period):
+        self.counts.pop(period, None)
+        for ticker in [ticker for ticker, periods in self.tickers.items() if period in periods]:
+            self.tickers[ticker].remove(period)
+            if not self.tickers[ticker]:
+                del self.tickers[ticker]
+
+    def read_file(self, path):
+        try:
+            with open(path, 'r') as file:
+                return [Stock.from_dict(record) for record in json.load(file)]
+        except FileNotFoundError:
+            logging.error(f"Archive segment {path} is missing.")
+        except json.JSONDecodeError as e:
+            corrupt_path = f"{path}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            os.replace(path, corrupt_path)
+            logging.error(f"{path} could not be read ({e}), moved it to {corrupt_path}.")
+        return None
+
+    def read(self, period, indexed=True):
+        if indexed and period not in self.counts:
+            return []
+        started = time.perf_counter()
+        records = self.read_file(self.segment_path(period))
+        registry.increment("rsa_archive_segment_loads_total")
+        registry.observe("rsa_archive_segment_load_seconds", time.perf_counter() - started)
+        if records is None:
+            self.forget(period)
+            self.index_dirty = True
+            return []
+        return records
+
+    # Loaded segment for a period, read on first use; a new period starts empty
+    def segment(self, period):
+        records = self.loaded.get(period)
+        if records is None:
+            records = self.loaded[period] = self.read(period)
+            for record in records:
+                self.owner[id(record)] = period
+        else:
+            self.loaded.move_to_end(period)
+        self.used[period] = time.monotonic()
+        self.evict(keep=period)
+        return records
+
+    # Least recently used first; unsaved and pinned segments stay, as does
+    # `keep`, which the caller is about to use
+    def evict(self, keep_recent=True, keep=None):
+        now = time.monotonic()
+        for period in list(self.loaded):
+            if len(self.loaded) <= self.max_loaded:
+                break
+            if period in self.dirty or period == keep or (keep_recent and now - self.used[period] < self.pin_seconds):
+                continue
+            for record in self.loaded.pop(period):
+                self.owner.pop(id(record), None)
+            del self.used[period]
+
+    def find(self, ticker):
+        ticker = ticker.upper()
+        return [record for period in list(self.tickers.get(ticker, ())) for record in self.segment(period) if ticker_key(record) == ticker]
+
+    # A record whose segment was unloaded while a command held it is matched
+    # back to the reloaded copy by ticker, date and source. The same company
+    # can have several past splits, so anything less specific is refused.
+    def locate(self, record):
+        period = self.owner.get(id(record))
+        if period is not None:
+            return period, record
+        key = identity(record)
+        period = self.period_of(record)
+        if period in self.tickers.get(ticker_key(record), ()):
+            for existing in self.segment(period):
+                if identity(existing) == key:
+                    return period, existing
+        logging.warning(f"Archived RSA '{record.ticker}' ({record.date}) was unloaded while in use and no longer matches a stored record, change not saved.")
+        return None
+
+    def add(self, record):
+        period = self.period_of(record)
+        self.segment(period).append(record)
+        self.owner[id(record)] = period
+        self.counts[period] = self.counts.get(period, 0) + 1
+        periods = self.tickers.setdefault(ticker_key(record), [])
+        if period not in periods:
+            bisect.insort(periods, period)
+        self.dirty.add(period)
+        self.index_dirty = True
+
+    def remove(self, record):
+        located = self.locate(record)
+        if located is None:
+            return False
+        period, existing = located
+        records = self.segment(period)
+        del records[position(records, existing)]
+        self.owner.pop(id(existing), None)
+        self.counts[period] -= 1
+        if not self.counts[period]:
+            del self.counts[period]
+        ticker = ticker_key(existing)
+        if not any(ticker_key(other) == ticker for other in records):
+            self.tickers[ticker].remove(period)
+            if not self.tickers[ticker]:
+                del self.tickers[ticker]
+        self.dirty.add(period)
+        self.index_dirty = True
+        return True
+
+    # Record edited in place; a new date may move it to another segment
+    def touch(self, record):
+        located = self.locate(record)
+        if located is None:
+            return False
+        period, existing = located
+        if self.period_of(record) != period:
+            self.remove(existing)
+            self.add(record)
+            return True
+        records = self.segment(period)
+        if existing is not record:
+            records[position(records, existing)] = record
+            self.owner.pop(id(existing), None)
+            self.owner[id(record)] = period
+        self.dirty.add(period)
+        return True
+
+    # One-off move of a past list held in stocks.json. Records a previous,
+    # interrupted move already put in a segment are not added twice.
+    def seal(self, records):
+        existing = {}
+        added = 0
+        for record in records:
+            period = self.period_of(record)
+            if period not in existing:
+                existing[period] = Counter(record_key(other) for other in self.segment(period))
+            key = record_key(record)
+            if existing[period][key]:
+                existing[period][key] -= 1
+                continue
+            self.add(record)
+            added += 1
+        self.write(self.prepare())
+        self.evict(keep_recent=False)
+        logging.info(f"Moved {added} past plays into {len(existing)} archive segments.")
+
+    # The reverse of seal, for when the archive is turned off: the plays not
+    # already in `records`, the past list a previous, interrupted move wrote
+    def unseal(self, records):
+        existing = Counter(record_key(record) for record in records)
+        restored = []
+        for record in self.records():
+            key = record_key(record)
+            if existing[key]:
+                existing[key] -= 1
+                continue
+            restored.append(record)
+        return restored
+
+    # Once its plays are saved elsewhere
+    def discard(self):
+        with self.lock:
+            for path in [self.segment_path(period) for period in self.counts] + [self.index_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.counts = {}
+        self.tickers = {}
+        self.loaded.clear()
+        self.used = {}
+        self.owner = {}
+        self.dirty = set()
+        self.index_dirty = False
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+    # Loaded segments are copied now, the others are read as the caller iterates
+    def records(self):
+        loaded = {period: list(records) for period, records in self.loaded.items()}
+        paths = [(period, self.segment_path(period)) for period in sorted(self.counts)]
+
+        def iterate():
+            for period, path in paths:
+                yield from loaded[period] if period in loaded else self.read_file(path) or []
+        return iterate()
+
+    def dump(self, records):
+        return json.dumps([record.to_dict() for record in records], separators=(',', ':'))
+
+    def index_text(self):
+        return json.dumps({'period': self.period, 'segments': self.counts, 'tickers': self.tickers}, separators=(',', ':'))
+
+    # None marks a segment that is now empty
+    def prepare(self):
+        periods, self.dirty = self.dirty, set()
+        texts = {period: self.dump(self.loaded[period]) if period in self.counts else None for period in periods}
+        index = self.index_text() if self.index_dirty else None
+        self.index_dirty = False
+        return texts, index
+
+    # Segments before the index, so the index never names a record that is not on disk
+    def write(self, payload):
+        texts, index = payload
+        with self.lock:
+            for period, text in texts.items():
+                path = self.segment_path(period)
+                if text is not None:
+                    replace_file(path, text)
+                elif os.path.exists(path):
+                    os.remove(path)
+            if index is not None:
+                replace_file(self.index_path, index)
+            elif texts and os.path.exists(self.index_path):
+                # Still current, but load() treats segments newer than it as unindexed
+                os.utime(self.index_path)
+
+    def unsaved(self, payload):
+        texts, index = payload
+        self.dirty.update(texts)
+        if index is not None:
+            self.index_dirty = True
@@ -0,0 +1,70 @@
+import argparse
+import json
+import random
+import string
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from models import BROKERS, DATE_FORMAT
+
+SIZES = {
+    "small": (10, 1000),
+    "medium": (50, 10000),
+    "large": (200, 50000)
+}
+
+def make_tickers(count, rng, taken):
+    tickers = []
+    while len(tickers) < count:
+        ticker = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 5)))
+        if ticker not in taken:
+            taken.add(ticker)
+            tickers.append(ticker)
+    return tickers
+
+def make_record(ticker, split_date, tag, rng):
+    price = round(rng.uniform(0.05, 40), 2)
+    ratio = rng.choice([5, 10, 15, 20, 25, 30, 50, 100])
+    return {
+        'Ticker': ticker,
+        'Current Price': price,
+        'Split Ratio': f"1:{ratio}",
+        'Date': split_date.strftime(DATE_FORMAT),
+        'Estimated Profit': round(price * (ratio - 1), 2),
+        'Source': f"https://www.sec.gov/Archives/edgar/data/{rng.randint(100000, 999999)}/",
+        'Transfer Agent': rng.choice([None, "Computershare", "Equiniti", "Continental Stock Transfer"]),
+        'Comments': rng.choice(["", "Round up confirmed in 8-K", "Cash in lieu"]),
+        'Tag': tag,
+        'BrokerTracking': {broker: rng.randint(0, 1) for broker in BROKERS}
+    }
+
+# A fifth of the active plays split today, the rest over the next two weeks;
+# past ones over the last few years
+def generate(active, past, seed=0, today=None):
+    rng = random.Random(seed)
+    today = today or date.today()
+    taken = set()
+    data = {"rsa": [], "research": [], "past": []}
+    for index, ticker in enumerate(make_tickers(active, rng, taken)):
+        days = 0 if index < max(1, active // 5) else rng.randint(1, 14)
+        data["rsa"].append(make_record(ticker, today + timedelta(days=days), 'pending', rng))
+    for ticker in make_tickers(past, rng, taken):
+        data["past"].append(make_record(ticker, today - timedelta(days=rng.randint(1, 1500)), rng.choice(["ROUNDED", "CIL"]), rng))
+    return data
+
+def write(path, active, past, seed=0):
+    with open(path, 'w') as file:
+        json.dump(generate(active, past, seed), file, separators=(',', ':'))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic stocks.json")
+    parser.add_argument("path")
+    parser.add_argument("--size", choices=SIZES, default="medium")
+    parser.add_argument("--active", type=int)
+    parser.add_argument("--past", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    active, past = SIZES[args.size]
+    write(args.path, args.active if args.active is not None else active, args.past if args.past is not None else past, args.seed)
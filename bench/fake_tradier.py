@@ -0,0 +1,127 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from aiohttp import web
+
+# Local stand-in for the Tradier endpoints the bot uses. Every symbol has a
+# stable made-up quote and company; latency and failures are configurable.
+class FakeTradier:
+    def __init__(self, latency=0.02, jitter=0.01, error_rate=0.0, seed=0, trade_interval=0.05):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.trade_interval = trade_interval
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.errors = 0
+        self.runner = None
+        self.port = None
+        self.sessions = set()
+        self.sockets = set()
+        self.subscriptions = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def stream_url(self):
+        return f"ws://127.0.0.1:{self.port}/v1/markets/events"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/v1/markets/quotes", self.quotes)
+        app.router.add_get("/v1/markets/lookup", self.lookup)
+        app.router.add_post("/v1/markets/events/session", self.session)
+        app.router.add_get("/v1/markets/events", self.events)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.disconnect()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def reset(self):
+        self.requests.clear()
+        self.errors = 0
+
+    async def respond(self, path, body):
+        self.requests[path] += 1
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"fault": "Internal error"}, status=500)
+        headers = {
+            "X-Ratelimit-Available": "100000",
+            "X-Ratelimit-Expiry": str(int((time.time() + 60) * 1000))
+        }
+        return web.json_response(body, headers=headers)
+
+    def price(self, symbol):
+        return round(random.Random(symbol).uniform(0.05, 40), 2)
+
+    async def quotes(self, request):
+        symbols = [symbol for symbol in request.query.get("symbols", "").upper().split(",") if symbol]
+        quotes = [{"symbol": symbol, "last": self.price(symbol), "bid": self.price(symbol), "ask": self.price(symbol)} for symbol in symbols]
+        quote = quotes[0] if len(quotes) == 1 else quotes
+        return await self.respond("quotes", {"quotes": {"quote": quote}})
+
+    async def lookup(self, request):
+        symbol = request.query.get("q", "").upper()
+        security = {"symbol": symbol, "exchange": "Q", "type": "stock", "description": f"{symbol.title()} Holdings Inc"}
+        return await self.respond("lookup", {"securities": {"security": security}})
+
+    async def session(self, request):
+        session_id = uuid.uuid4().hex
+        self.sessions.add(session_id)
+        return await self.respond("session", {"stream": {"url": self.stream_url, "sessionid": session_id}})
+
+    # Market events: after a subscription payload, a trade and a quote for each
+    # subscribed symbol every trade_interval; a new payload replaces the symbols
+    async def events(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        symbols = []
+        sender = None
+
+        async def send_events():
+            while not ws.closed:
+                for symbol in symbols:
+                    price = round(self.price(symbol) * self.rng.uniform(0.98, 1.02), 4)
+                    trade = {"type": "trade", "symbol": symbol, "price": str(price), "size": "100", "date": str(int(time.time() * 1000))}
+                    quote = {"type": "quote", "symbol": symbol, "bid": round(price - 0.01, 4), "ask": round(price + 0.01, 4)}
+                    try:
+                        await ws.send_str(json.dumps(trade) + "\n" + json.dumps(quote) + "\n")
+                    except ConnectionError:
+                        return
+                await asyncio.sleep(self.trade_interval)
+
+        try:
+            async for message in ws:
+                payload = json.loads(message.data)
+                if payload.get("sessionid") not in self.sessions:
+                    await ws.close(message=b"invalid session")
+                    break
+                symbols = [symbol.upper() for symbol in payload.get("symbols", [])]
+                self.subscriptions.append(symbols)
+                if sender is None:
+                    sender = asyncio.get_running_loop().create_task(send_events())
+        finally:
+            if sender is not None:
+                sender.cancel()
+            self.sockets.discard(ws)
+        return ws
+
+    # Drops every open stream, as a server restart would
+    async def disconnect(self):
+        for ws in list(self.sockets):
+            await ws.close()
@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import secrets as stdlib_secrets
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import dataset
+from fake_tradier import FakeTradier
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The bot never logs in here; it only needs the names from secrets.py
+def install_secrets():
+    module = types.ModuleType("secrets")
+    module.__dict__.update(stdlib_secrets.__dict__)
+    module.DISCORD_TOKEN = "bench"
+    module.TRADIER_API_KEY = "bench"
+    module.DISCORD_GUILD = []
+    module.DISCORD_CHANN = []
+    sys.modules["secrets"] = module
+
+class MockMember:
+    display_name = "bench"
+
+class MockContext:
+    def __init__(self):
+        self.deferred = False
+        self.responded = False
+        self.sent = 0
+        self.member = MockMember()
+        self.author = MockMember()
+        self.custom_id = None
+
+    async def defer(self, ephemeral=False, edit_origin=False):
+        self.deferred = True
+
+    async def send(self, content=None, **kwargs):
+        self.responded = True
+        self.sent += 1
+
+    async def edit_origin(self, **kwargs):
+        self.sent += 1
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+# name -> (setup, timed call); setup runs untimed before every iteration
+def build_scenarios(rsa, rng, json_path):
+    from store import DocumentStore, open_backend
+    from archive import Archive
+    active = rsa.store.tickers_in("rsa")
+    past = rsa.store.tickers_in("past")
+    future = (date.today() + timedelta(days=30)).strftime("%m-%d-%Y")
+    added = []
+    confirmed = []
+    counter = iter(range(10 ** 9))
+
+    # Startup as the bot does it (stocks.json plus the archive index), and the
+    # single-file layout with every past play in stocks.json
+    def load():
+        DocumentStore(open_backend("json", rsa.JSON_FILE, "unused.db"), archive=Archive(rsa.ARCHIVE_DIR, rsa.ARCHIVE_PERIOD)).load()
+
+    def load_flat():
+        DocumentStore(open_backend("json", json_path, "unused.db")).load()
+
+    def clear_renders():
+        rsa.render_cache.pages.clear()
+
+    def clear_quotes():
+        rsa.quote_cache.quotes.clear()
+
+    async def rsa_stock():
+        await rsa.rsa_stock.callback(MockContext(), rng.choice(active + past))
+
+    async def list_stocks():
+        await rsa.list_stocks.callback(MockContext())
+
+    async def list_upcoming_stocks():
+        await rsa.list_upcoming_stocks.callback(MockContext())
+
+    async def add_stock():
+        ticker = f"BN{next(counter)}"
+        await rsa.add_stock.callback(MockContext(), ticker, "1:10", "https://example.com/8-k", date=future)
+        if rsa.store.find(ticker, ("rsa",)):
+            added.append(ticker)
+
+    async def edit_stock():
+        ticker = rng.choice(active)
+        stock = rsa.store.find_one(ticker, ("rsa",))[1]
+        await rsa.edit_stock.callback(MockContext(), ticker, split_ratio=rng.choice(["1:10", "1:20"]), date=stock.date)
+
+    async def brokers():
+        await rsa.brokers.callback(MockContext(), rng.choice(active + past), "DAILY", rng.randint(0, 1))
+
+    # Confirm and delete the plays add_stock created so the dataset keeps its size
+    async def confirm_stock():
+        ticker = added.pop() if added else "MISSING"
+        await rsa.confirm_stock.callback(MockContext(), ticker, "ROUNDED")
+        confirmed.append(ticker)
+
+    async def delete_stock():
+        await rsa.delete_stock.callback(MockContext(), confirmed.pop() if confirmed else "MISSING")
+
+    async def refresh_prices():
+        await rsa.refresh_prices(rsa.active_tickers())
+
+    def refresh_targets():
+        rsa.refresh_targets()
+
+    def autocomplete():
+        rsa.ticker_index.complete(rng.choice("abcdefghijklmnopqrstuvwxyz"), ("rsa", "past"))
+
+    # A company lookup landed just before the keystroke
+    def autocomplete_changed():
+        ticker = rng.choice(past)
+        rsa.company_cache.put(ticker, {"description": f"{ticker.title()} Renamed Holdings", "exchange": "Q"})
+        rsa.ticker_index.complete(ticker[:2].lower(), ("rsa", "past"))
+
+    return {
+        "load": (None, load),
+        "load_flat": (None, load_flat),
+        "rsa_stock": (None, rsa_stock),
+        "list_stocks": (None, list_stocks),
+        "list_stocks_cold": (clear_renders, list_stocks),
+        "list_upcoming_stocks": (clear_renders, list_upcoming_stocks),
+        "add_stock": (None, add_stock),
+        "edit_stock": (None, edit_stock),
+        "brokers": (None, brokers),
+        "confirm_stock": (None, confirm_stock),
+        "delete_stock": (None, delete_stock),
+        "refresh_prices": (clear_quotes, refresh_prices),
+        "refresh_targets": (None, refresh_targets),
+        "autocomplete": (None, autocomplete),
+        "autocomplete_changed": (None, autocomplete_changed)
+    }
+
+async def call(function):
+    result = function()
+    if asyncio.iscoroutine(result):
+        await result
+
+# Background revalidations count towards the command that started them
+async def settle(rsa):
+    while rsa.revalidations:
+        await asyncio.gather(*rsa.revalidations, return_exceptions=True)
+
+# The last iteration runs under tracemalloc for peak memory and is left out of the timings
+async def measure(rsa, fake, setup, function, iterations):
+    fake.reset()
+    timings = []
+    for _ in range(iterations - 1):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        await call(function)
+        timings.append(time.perf_counter() - started)
+        await settle(rsa)
+    if setup:
+        setup()
+    tracemalloc.start()
+    await call(function)
+    await settle(rsa)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    requests = sum(fake.requests.values())
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+        "requests": requests,
+        "requests_per_call": round(requests / iterations, 2),
+        "errors": fake.errors,
+        "peak_kb": round(peak / 1024, 1)
+    }
+
+async def run(args, workdir):
+    active, past = dataset.SIZES[args.size]
+    active = args.active if args.active is not None else active
+    past = args.past if args.past is not None else past
+    json_path = os.path.join(workdir, "dataset.json")
+    dataset.write(json_path, active, past, args.seed)
+    with open(json_path) as source, open(os.path.join(workdir, "stocks.json"), 'w') as target:
+        target.write(source.read())
+
+    fake = FakeTradier(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    await fake.start()
+
+    install_secrets()
+    os.chdir(workdir)
+    import rsa
+    import tradier
+    from ratelimit import RateLimiter
+    rsa.log_listener.handlers = tuple(handler for handler in rsa.log_listener.handlers if type(handler) is not logging.StreamHandler)
+    tradier.API_URL = fake.url
+    tradier.limiter = RateLimiter(rate=args.rate_limit, per=60, background_reserve=0)
+    # Built by on_startup in the bot
+    rsa.ticker_index.refresh()
+
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(rsa, rng, json_path)
+    selected = args.only.split(",") if args.only else list(scenarios)
+    results = {}
+    try:
+        for name in selected:
+            setup, function = scenarios[name]
+            results[name] = await measure(rsa, fake, setup, function, args.iterations)
+            print_row(name, results[name])
+    finally:
+        await rsa.store.settle()
+        rsa.store.close()
+        await tradier.close()
+        await fake.stop()
+        rsa.log_listener.stop()
+
+    return {
+        "size": args.size,
+        "active": active,
+        "past": past,
+        "iterations": args.iterations,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "python": platform.python_version(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        "scenarios": results
+    }
+
+def print_header():
+    print(f"{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'requests':>10}{'peak KB':>10}")
+
+def print_row(name, result):
+    print(f"{name:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['max_ms']:>10}{result['requests']:>10}{result['peak_kb']:>10}")
+
+def change(current, previous):
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+# A scenario regresses when p95 grows past the threshold (and by at least
+# min_ms, to ignore noise on sub-millisecond calls) or it makes more requests
+def compare(results, baseline, threshold, min_ms):
+    if (baseline.get("active"), baseline.get("past")) != (results["active"], results["past"]):
+        print(f"Warning: baseline used {baseline.get('active')}/{baseline.get('past')} records, this run {results['active']}/{results['past']}.")
+    regressions = []
+    print(f"\n{'scenario':<22}{'p50':>10}{'p95':>10}{'requests':>10}{'peak':>10}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            print(f"{name:<22}{'new':>10}")
+            continue
+        slower = current["p95_ms"] > previous["p95_ms"] * (1 + threshold) and current["p95_ms"] - previous["p95_ms"] >= min_ms
+        chattier = current["requests_per_call"] > previous["requests_per_call"]
+        flag = "  REGRESSION" if slower or chattier else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<22}{change(current['p50_ms'], previous['p50_ms']):>10}{change(current['p95_ms'], previous['p95_ms']):>10}"
+              f"{current['requests'] - previous['requests']:>+10}{change(current['peak_kb'], previous['peak_kb']):>10}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's command handlers against a synthetic dataset and a local Tradier stand-in")
+    parser.add_argument("--size", choices=dataset.SIZES, default="medium")
+    parser.add_argument("--active", type=int, help="Override the number of active plays")
+    parser.add_argument("--past", type=int, help="Override the number of past plays")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake Tradier latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake Tradier requests answered with a 500")
+    parser.add_argument("--rate-limit", type=int, default=100000, help="Local request budget per minute")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="Comma separated scenarios to run")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 slowdown against the baseline")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="Ignore p95 slowdowns smaller than this")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    if args.iterations < 2:
+        parser.error("--iterations must be at least 2")
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    print_header()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+        os.chdir(ROOT)
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if baseline:
+        with open(baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold, args.min_ms)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import csv
+import io
+import json
+import aiohttp
+from models import BROKERS, FIELDS, valid_split_ratio, normalize_date
+
+MAX_IMPORT_BYTES = 1024 * 1024
+MAX_IMPORT_ROWS = 500
+DOWNLOAD_TIMEOUT = 30
+
+# Accepted import headers, compared lower-case with spaces and underscores dropped
+COLUMNS = {
+    'ticker': 'ticker',
+    'splitratio': 'split_ratio',
+    'split': 'split_ratio',
+    'source': 'source',
+    'date': 'date',
+    'agent': 'agent',
+    'transferagent': 'agent',
+    'comments': 'comments'
+}
+
+EXPORT_COLUMNS = ['List'] + list(FIELDS) + ['Price Updated', 'Available On']
+
+def column_name(header):
+    return COLUMNS.get((header or '').lower().replace(' ', '').replace('_', ''))
+
+async def download(url):
+    timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return await response.content.read(MAX_IMPORT_BYTES + 1)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise ValueError(f"Could not download the attachment: {e!r}")
+
+# CSV with a header row, a JSON list of objects, or a stocks.json-style export (its 'rsa' list).
+# Each play's 'row' says where it came from, for error messages.
+def parse_import(filename, content):
+    if len(content) > MAX_IMPORT_BYTES:
+        raise ValueError(f"Attachment is larger than {MAX_IMPORT_BYTES // 1024} KB.")
+    try:
+        text = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("Attachment is not UTF-8 text.")
+
+    if filename.lower().endswith('.json'):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get('rsa')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON must be a list of objects.")
+        places = [f"Item {index}" for index in range(1, len(rows) + 1)]
+    elif filename.lower().endswith('.csv'):
+        reader = csv.DictReader(io.StringIO(text))
+        rows = []
+        places = []
+        # File line a row starts on; the header is line 1 and quoted values can span lines
+        start = reader.line_num + 1 if reader.fieldnames is not None else 1
+        for row in reader:
+            rows.append(row)
+            places.append(f"Line {start}")
+            start = reader.line_num + 1
+    else:
+        raise ValueError("Attachment must be a .csv or .json file.")
+
+    if not rows:
+        raise ValueError("Attachment has no rows.")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"Attachment has {len(rows)} rows, the limit is {MAX_IMPORT_ROWS}.")
+
+    plays = []
+    for row, place in zip(rows, places):
+        play = {'row': place}
+        for header, value in row.items():
+            name = column_name(header)
+            if name is not None and value is not None:
+                play[name] = str(value).strip()
+        plays.append(play)
+    return plays
+
+# Same checks as /new; `existing` holds tickers already in rsa
+def validate_plays(plays, existing):
+    errors = []
+    valid = []
+    seen = set()
+    for index, play in enumerate(plays, start=1):
+        row = play.get('row') or f"Row {index}"
+        ticker = play.get('ticker', '').upper()
+        if not ticker:
+            errors.append(f"{row}: missing ticker.")
+            continue
+        if not valid_split_ratio(play.get('split_ratio')):
+            errors.append(f"{row} ({ticker}): invalid split ratio, format should be like '1:10'.")
+            continue
+        if not play.get('source'):
+            errors.append(f"{row} ({ticker}): missing source.")
+            continue
+        try:
+            date = normalize_date(play.get('date'))
+        except ValueError:
+            errors.append(f"{row} ({ticker}): invalid date, use 'MM-DD-YYYY'.")
+            continue
+        if ticker in existing:
+            errors.append(f"{row}: RSA '{ticker}' already exists.")
+            continue
+        if ticker in seen:
+            errors.append(f"{row}: RSA '{ticker}' is listed more than once.")
+            continue
+        seen.add(ticker)
+        valid.append(dict(play, ticker=ticker, date=date, agent=play.get('agent') or None, comments=play.get('comments', '')))
+    return valid, errors
+
+# Written record by record so a large archive is never held as one document
+def write_export(file, lists, export_format):
+    if export_format == "csv":
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        for key, stocks in lists:
+            for stock in stocks:
+                record = stock.to_dict()
+                available = [broker for broker in BROKERS if stock.is_available(broker)]
+                writer.writerow([key] + [record.get(field) for field in EXPORT_COLUMNS[1:-1]] + [";".join(available)])
+        text.flush()
+        text.detach()
+    else:
+        file.write(b"{")
+        for position, (key, stocks) in enumerate(lists):
+            file.write(f'{"," if position else ""}{json.dumps(key)}:['.encode())
+            for index, stock in enumerate(stocks):
+                if index:
+                    file.write(b",")
+                file.write(json.dumps(stock.to_dict(), separators=(',', ':')).encode())
+            file.write(b"]")
+        file.write(b"}")
+    file.seek(0)
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from ratelimit import BACKGROUND
+
+# Company description/exchange cache, persisted between restarts. Saved a
+# few seconds after it changes, in a thread; `changes` and `written` count
+# changes made and saved so an older save never replaces a newer one.
+class CompanyCache:
+    def __init__(self, path, ttl=30 * 24 * 3600, max_entries=5000, save_delay=5):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.save_task = None
+        self.changes = 0
+        self.written = 0
+        self.hits = 0
+        self.misses = 0
+        # Called with the ticker whenever its entry is added, replaced or dropped
+        self.listeners = []
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning(f"Company cache {self.path} could not be read, starting empty: {e}")
+            return
+        now = time.time()
+        for ticker, entry in sorted(entries.items(), key=lambda item: item[1].get('used', 0)):
+            if now - entry.get('fetched', 0) < self.ttl:
+                self.entries[ticker] = entry
+        self.evict()
+
+    def get(self, ticker):
+        ticker = ticker.upper()
+        entry = self.entries.get(ticker)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry['fetched'] >= self.ttl:
+            self.invalidate(ticker)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(ticker)
+        entry['used'] = time.time()
+        return entry
+
+    # No expiry check or LRU bump, for callers that must stay cheap
+    def peek(self, ticker):
+        return self.entries.get(ticker.upper())
+
+    def put(self, ticker, company):
+        ticker = ticker.upper()
+        now = time.time()
+        self.entries[ticker] = {
+            'description': company['description'],
+            'exchange': company['exchange'],
+            'fetched': now,
+            'used': now
+        }
+        self.entries.move_to_end(ticker)
+        self.evict()
+        self.changed(ticker)
+
+    def invalidate(self, ticker):
+        if self.entries.pop(ticker.upper(), None) is not None:
+            self.changed(ticker.upper())
+
+    def evict(self):
+        while len(self.entries) > self.max_entries:
+            ticker, _ = self.entries.popitem(last=False)
+            self.changed(ticker)
+
+    def changed(self, ticker):
+        self.changes += 1
+        for listener in self.listeners:
+            listener(ticker)
+
+    def save_later(self):
+        if self.changes == self.written or self.save_task is not None and not self.save_task.done():
+            return
+        self.save_task = asyncio.get_running_loop().create_task(self.save())
+
+    async def save(self):
+        await asyncio.sleep(self.save_delay)
+        # The thread gets its own dict, entries come and go on the loop while it writes
+        entries = dict(self.entries)
+        try:
+            await asyncio.to_thread(self.write, entries, self.changes)
+        except OSError as e:
+            logging.warning(f"Company cache {self.path} could not be saved: {e}")
+
+    def write(self, entries, changes):
+        with self.lock:
+            if changes <= self.written:
+                return
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as file:
+                json.dump(entries, file, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+            self.written = changes
+
+    # Shutdown
+    def flush(self):
+        if self.save_task is not None:
+            self.save_task.cancel()
+        if self.changes != self.written:
+            self.write(self.entries, self.changes)
+
+# Process-wide quote cache; concurrent lookups for a symbol share one fetch,
+# unless the fetch in flight has a lower priority than the caller
+class QuoteCache:
+    def __init__(self, fetch, ttl=60):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.quotes = {}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # Merge pushed fields (e.g. from the quote stream) into the cached quote
+    def update(self, ticker, **fields):
+        symbol = ticker.upper()
+        entry = self.quotes.get(symbol)
+        quote = dict(entry[1]) if entry else {'symbol': symbol}
+        quote.update(fields)
+        self.quotes[symbol] = (time.monotonic(), quote)
+
+    async def get_many(self, tickers, max_age=None, priority=None):
+        max_age = self.ttl if max_age is None else max_age
+        rank = BACKGROUND if priority is None else priority
+        symbols = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        now = time.monotonic()
+        quotes = {}
+        to_fetch = []
+        waiting = {}
+        for symbol in symbols:
+            entry = self.quotes.get(symbol)
+            if entry is not None and now - entry[0] <= max_age:
+                self.hits += 1
+                quotes[symbol] = entry[1]
+                continue
+            self.misses += 1
+            pending = self.pending.get(symbol)
+            if pending is not None and pending[1] <= rank:
+                self.coalesced += 1
+                waiting[symbol] = pending[0]
+            else:
+                to_fetch.append(symbol)
+
+        if to_fetch:
+            loop = asyncio.get_running_loop()
+            futures = {symbol: loop.create_future() for symbol in to_fetch}
+            self.pending.update((symbol, (future, rank)) for symbol, future in futures.items())
+            fetched = {}
+            try:
+                if priority is None:
+                    fetched, _ = await self.fetch(to_fetch)
+                else:
+                    fetched, _ = await self.fetch(to_fetch, priority=priority)
+            finally:
+                fetched_at = time.monotonic()
+                for symbol, future in futures.items():
+                    quote = fetched.get(symbol)
+                    if quote is not None:
+                        self.quotes[symbol] = (fetched_at, quote)
+                    if self.pending.get(symbol, (None,))[0] is future:
+                        del self.pending[symbol]
+                    future.set_result(quote)
+                    quotes[symbol] = quote
+
+        for symbol, future in waiting.items():
+            quotes[symbol] = await asyncio.shield(future)
+
+        missing = [symbol for symbol in symbols if not quotes.get(symbol) or quotes[symbol].get('last') is None]
+        return quotes, missing
+
+    async def get_price(self, ticker, max_age=None, priority=None):
+        quotes, _ = await self.get_many([ticker], max_age, priority)
+        quote = quotes.get(ticker.upper())
+        return quote.get('last') if quote else None
+
+
+# Rendered bulletin pages keyed by view, arguments and data version
+class RenderCache:
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        pages = self.pages.get(key)
+        if pages is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.pages.move_to_end(key)
+        return pages
+
+    def put(self, key, pages):
+        self.pages[key] = pages
+        self.pages.move_to_end(key)
+        while len(self.pages) > self.max_entries:
+            self.pages.popitem(last=False)
@@ -0,0 +1,83 @@
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+
+FORMAT = '%(asctime)s [%(levelname)s]: %(message)s'
+PAYLOAD_LIMIT = 500
+
+# Appends `extra=fields(...)` values as key=value pairs, quoted when they contain spaces
+class FieldsFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        values = getattr(record, 'fields', None)
+        if not values:
+            return message
+        return f"{message} | " + " ".join(f"{key}={format_field(value)}" for key, value in values.items() if value is not None)
+
+def format_field(value):
+    text = str(value)
+    if not text or any(char in text for char in ' "=|'):
+        return json.dumps(text)
+    return text
+
+def fields(**values):
+    return {'fields': values}
+
+# Records are queued on the event loop and written by a listener thread, so a
+# slow disk never blocks a command. Rotates by size, or by time when `when` is set.
+def setup_logging(path, level=logging.INFO, max_bytes=5 * 1024 * 1024, backups=5, when=None, console=True):
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    handlers = [file_handler]
+    if console:
+        handlers.append(logging.StreamHandler())
+    formatter = FieldsFormatter(FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+# Large response bodies only at DEBUG, for a sample of calls, cut to `limit` characters
+def log_payload(label, payload, sample_rate=0.1, limit=PAYLOAD_LIMIT):
+    if not logging.getLogger().isEnabledFor(logging.DEBUG) or random.random() >= sample_rate:
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+    if len(text) > limit:
+        text = f"{text[:limit]}... ({len(text)} chars)"
+    logging.debug(f"{label}: {text}")
+
+# One structured line per command, for later analysis of who ran what and how long it took
+def logged(callback, command):
+    @functools.wraps(callback)
+    async def wrapper(ctx, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await callback(ctx, *args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            user = getattr(getattr(ctx, 'author', None), 'display_name', None)
+            ticker = kwargs.get('ticker')
+            logging.info("Command finished", extra=fields(
+                command=command,
+                ticker=ticker.upper() if isinstance(ticker, str) else None,
+                user=user,
+                outcome=outcome,
+                duration_ms=round((time.perf_counter() - started) * 1000, 1)
+            ))
+    return wrapper
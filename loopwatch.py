@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from metrics import registry
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+INTERNAL_FILES = {os.path.abspath(__file__), os.path.join(PROJECT_DIR, "metrics.py")}
+
+registry.describe("rsa_event_loop_lag_seconds", "histogram", "How late the watchdog heartbeat woke up")
+registry.describe("rsa_event_loop_stalls_total", "counter", "Heartbeats delayed past the stall threshold, by command")
+
+# Marks a command on the stack so a stall can be pinned on it and its user
+def attribute(callback, command):
+    @functools.wraps(callback)
+    async def attributed_handler(ctx, *args, **kwargs):
+        # Read from the frame by the watchdog thread
+        running_command = command
+        return await callback(ctx, *args, **kwargs)
+    return attributed_handler
+
+def find_handler(frame):
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "attributed_handler" and os.path.abspath(code.co_filename) in INTERNAL_FILES:
+            ctx = frame.f_locals.get('ctx')
+            user = getattr(getattr(ctx, 'author', None), 'display_name', None)
+            return frame.f_locals.get('running_command'), user
+        frame = frame.f_back
+    return None, None
+
+# Innermost frame in this project's code, i.e. the line that made the blocking call
+def blocking_site(stack):
+    for entry in reversed(stack):
+        filename = os.path.abspath(entry.filename)
+        if filename.startswith(PROJECT_DIR + os.sep) and filename not in INTERNAL_FILES:
+            return f"{os.path.relpath(filename, PROJECT_DIR)}:{entry.lineno} in {entry.name}"
+    return "unknown"
+
+# Opt-in event loop lag monitor. A heartbeat task measures how late the loop
+# wakes it; a thread watches the heartbeat and, when it is overdue, captures
+# the loop thread's stack while the blocking call is still running.
+class LoopWatchdog:
+    def __init__(self, threshold=0.25, interval=0.1, history=200, report_every=3600, stack_depth=15):
+        self.threshold = threshold
+        self.interval = interval
+        self.report_every = report_every
+        self.stack_depth = stack_depth
+        self.stalls = collections.deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.captured = None
+        self.beat = None
+        self.loop_thread = None
+        self.task = None
+        self.thread = None
+        self.last_report = None
+        self.unreported = 0
+
+    def start(self):
+        if self.task is not None and not self.task.done():
+            return
+        self.loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self.last_report = self.beat
+        self.stopping.clear()
+        self.task = asyncio.get_running_loop().create_task(self.heartbeat())
+        self.thread = threading.Thread(target=self.monitor, name="loop-watchdog", daemon=True)
+        self.thread.start()
+        logging.info(f"Event loop watchdog started, reporting stalls over {self.threshold * 1000:.0f}ms.")
+
+    async def stop(self):
+        self.stopping.set()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.thread is not None:
+            await asyncio.to_thread(self.thread.join)
+            self.thread = None
+
+    async def heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            previous, self.beat = self.beat, now
+            registry.observe("rsa_event_loop_lag_seconds", lag)
+            if lag >= self.threshold:
+                self.record(lag, previous)
+            self.maybe_report(now)
+
+    def monitor(self):
+        while not self.stopping.wait(self.interval / 2):
+            beat = self.beat
+            if time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            with self.lock:
+                if self.captured is not None and self.captured['beat'] == beat:
+                    continue
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            command, user = find_handler(frame)
+            del frame
+            capture = {
+                'beat': beat,
+                'command': command,
+                'user': user,
+                'site': blocking_site(stack),
+                'stack': "".join(traceback.format_list(stack[-self.stack_depth:]))
+            }
+            with self.lock:
+                self.captured = capture
+            logging.warning(f"Event loop blocked for over {self.threshold * 1000:.0f}ms by {capture['command'] or 'background work'}"
+                            f"{f' (requested by {user})' if user else ''} at {capture['site']}:\n{capture['stack']}")
+
+    # Heartbeat came back late; pair it with the stack the thread caught, if any
+    def record(self, lag, beat):
+        with self.lock:
+            capture = self.captured if self.captured is not None and self.captured['beat'] == beat else None
+        command = capture['command'] if capture else None
+        site = capture['site'] if capture else "unknown"
+        self.stalls.append((time.time(), command or "-", site, lag))
+        self.unreported += 1
+        registry.increment("rsa_event_loop_stalls_total", command=command or "-")
+        logging.warning(f"Event loop stalled for {lag * 1000:.0f}ms ({command or 'background work'} at {site}).")
+
+    # Rolling worst offenders over the last `history` stalls, by total time blocked
+    def top(self, count=5):
+        totals = {}
+        for _, command, site, lag in list(self.stalls):
+            entry = totals.setdefault((command, site), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += lag
+            entry[2] = max(entry[2], lag)
+        ranked = sorted(totals.items(), key=lambda item: -item[1][1])[:count]
+        return [{'command': command, 'site': site, 'stalls': stalls, 'total': total, 'worst': worst} for (command, site), (stalls, total, worst) in ranked]
+
+    def maybe_report(self, now):
+        if not self.unreported or now - self.last_report < self.report_every:
+            return
+        self.last_report = now
+        self.unreported = 0
+        lines = [f"{entry['stalls']}x {entry['total'] * 1000:.0f}ms total, worst {entry['worst'] * 1000:.0f}ms: {entry['command']} at {entry['site']}" for entry in self.top()]
+        logging.warning("Top event loop blockers:\n" + "\n".join(lines))
+
+    def status(self):
+        return {
+            'running': self.task is not None and not self.task.done(),
+            'threshold': self.threshold,
+            'stalls': len(self.stalls),
+            'top': self.top()
+        }
@@ -0,0 +1,157 @@
+import bisect
+import functools
+import logging
+import math
+import time
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Fixed-bucket histogram; observe is a bisect and three additions
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Upper bound of the bucket holding the q-th observation
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Process-wide metrics. Hot paths only touch dicts; collectors registered with
+# collect() are called when someone scrapes or runs /stats, never otherwise.
+class Registry:
+    def __init__(self):
+        self.descriptions = {}
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = []
+
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    # `collect` returns a number, or a list of (labels dict, number)
+    def collect(self, name, kind, help_text, collect):
+        self.describe(name, kind, help_text)
+        self.collectors.append((name, collect))
+
+    def histogram_series(self, name):
+        return [(dict(labels), histogram) for (series, labels), histogram in list(self.histograms.items()) if series == name]
+
+    def counter_series(self, name):
+        return [(dict(labels), value) for (series, labels), value in list(self.counters.items()) if series == name]
+
+    def collected(self):
+        values = {}
+        for name, collect in self.collectors:
+            try:
+                result = collect()
+            except Exception as e:
+                logging.warning(f"Metric {name} could not be collected: {e!r}")
+                continue
+            if result is None:
+                continue
+            if not isinstance(result, list):
+                result = [({}, result)]
+            values.setdefault(name, []).extend((label_key(labels), value) for labels, value in result if value is not None)
+        return values
+
+    # Prometheus text exposition format 0.0.4
+    def render(self):
+        series = {}
+        for (name, labels), histogram in list(self.histograms.items()):
+            series.setdefault(name, []).append(("histogram", labels, histogram))
+        for (name, labels), value in list(self.counters.items()):
+            series.setdefault(name, []).append(("counter", labels, value))
+        for name, values in self.collected().items():
+            kind = self.descriptions[name][0]
+            series.setdefault(name, []).extend((kind, labels, value) for labels, value in values)
+
+        lines = []
+        for name in sorted(series):
+            entries = series[name]
+            kind, help_text = self.descriptions.get(name, (entries[0][0], ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for entry_kind, labels, value in entries:
+                if entry_kind != "histogram":
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets + (math.inf,), value.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', format_value(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(value.sum)}")
+                lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    # Wraps a coroutine function, recording its duration and whether it raised
+    def timed(self, name, callback, **labels):
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                self.increment(f"{name}_errors_total", **labels)
+                raise
+            finally:
+                self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+        return wrapper
+
+registry = Registry()
+
+# Plain-text /metrics endpoint, bound to localhost unless told otherwise
+async def start_server(port, host="127.0.0.1"):
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return runner
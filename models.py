@@ -0,0 +1,151 @@
+import re
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Optional
+
+TAGS = ["CIL", "ROUNDED", "PENDING"]
+BROKERS = ["Fidelity", "Merrill Edge", "Robinhood", "Schwab", "Tastyworks", 
+           "Public", "Stocktwits", "Tradier", "Vanguard", "Ally", "Firstrade", 
+           "Plynk", "BBAE", "dSPAC", "Webull", "AInvest", "Fennel", "OptionsAI", 
+           "Chase", "Invstr+", "Wells Fargo", "Tornado", "SoFi"]
+DAILY_BROKERS = ["Schwab", "Tastyworks", "Public", "Stocktwits", "Firstrade", "Webull", "Tradier", "BBAE", "dSPAC", "AInvest", "Chase", "Invstr+", "Tornado", "SoFi"]
+
+# One bit per broker, in BROKERS order; stored records keep these masks, so
+# new brokers go on the end
+BROKER_BITS = {broker: 1 << index for index, broker in enumerate(BROKERS)}
+ALL_BROKERS = (1 << len(BROKERS)) - 1
+
+def broker_mask(brokers):
+    mask = 0
+    for broker in brokers:
+        mask |= BROKER_BITS.get(broker, 0)
+    return mask
+
+DAILY_MASK = broker_mask(DAILY_BROKERS)
+
+# Input checks shared by /new, /edit and /import
+SPLIT_RATIO_PATTERN = re.compile(r'^1:\d+(\.\d+)?$')
+DATE_FORMAT = "%m-%d-%Y"
+
+def valid_split_ratio(split_ratio):
+    return bool(SPLIT_RATIO_PATTERN.match(split_ratio or ''))
+
+# Raises ValueError; no date means today
+def normalize_date(value):
+    if not value:
+        return datetime.now().strftime(DATE_FORMAT)
+    return datetime.strptime(value, DATE_FORMAT).strftime(DATE_FORMAT)
+
+FIELDS = {
+    'Ticker': 'ticker',
+    'Current Price': 'current_price',
+    'Split Ratio': 'split_ratio',
+    'Date': 'date',
+    'Estimated Profit': 'estimated_profit',
+    'Source': 'source',
+    'Transfer Agent': 'transfer_agent',
+    'Comments': 'comments',
+    'Tag': 'tag'
+}
+
+
+# A play. `available` is a bitmask over BROKERS; `tracked` marks the brokers the
+# record has an entry for, so records older than a broker round-trip unchanged.
+# `absent` names the keys the stored record did not have; they are left out
+# again while they still hold the default.
+@dataclass(slots=True, eq=False)
+class Stock:
+    ticker: str = ''
+    current_price: Optional[float] = None
+    split_ratio: str = ''
+    date: str = ''
+    estimated_profit: Optional[float] = None
+    source: str = ''
+    transfer_agent: Optional[str] = None
+    comments: str = ''
+    tag: str = 'pending'
+    available: int = 0
+    tracked: int = ALL_BROKERS
+    price_updated: Optional[str] = None
+    extra: Optional[dict] = None
+    absent: tuple = ()
+
+    def is_available(self, broker):
+        return bool(self.available & BROKER_BITS.get(broker, 0))
+
+    def set_available(self, mask, status):
+        if status:
+            self.available |= mask & self.tracked
+        else:
+            self.available &= ~mask
+
+    def broker_tracking(self):
+        tracking = {broker: int(bool(self.available & bit)) for broker, bit in BROKER_BITS.items() if self.tracked & bit}
+        if self.extra and 'BrokerTracking' in self.extra:
+            tracking.update(self.extra['BrokerTracking'])
+        return tracking
+
+    def is_default(self, key):
+        if key == 'BrokerTracking':
+            return not self.available and self.tracked == ALL_BROKERS
+        attribute = FIELDS[key]
+        return getattr(self, attribute) == DEFAULTS[attribute]
+
+    # stocks.json record layout; brokers are stored as the two masks, only
+    # brokers missing from BROKERS keep a BrokerTracking entry
+    def to_dict(self):
+        record = {key: getattr(self, attribute) for key, attribute in FIELDS.items() if key not in self.absent or not self.is_default(key)}
+        if 'BrokerTracking' not in self.absent or not self.is_default('BrokerTracking'):
+            record['Brokers'] = self.available
+            record['Tracked Brokers'] = self.tracked
+        if self.price_updated is not None:
+            record['Price Updated'] = self.price_updated
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+    # Reads both the masks and the older layout of one BrokerTracking entry per broker
+    @classmethod
+    def from_dict(cls, record):
+        stock = cls(**{attribute: record[key] for key, attribute in FIELDS.items() if key in record})
+        extra = {key: value for key, value in record.items() if key not in FIELDS and key not in OWN_KEYS}
+        stock.price_updated = record.get('Price Updated')
+        absent = [key for key in FIELDS if key not in record]
+        if 'Brokers' in record:
+            stock.available = record['Brokers']
+            stock.tracked = record.get('Tracked Brokers', ALL_BROKERS)
+        elif 'BrokerTracking' in record:
+            stock.tracked = 0
+        else:
+            absent.append('BrokerTracking')
+        stock.absent = tuple(absent)
+        if 'BrokerTracking' in record:
+            unknown = {}
+            for broker, value in (record['BrokerTracking'] or {}).items():
+                bit = BROKER_BITS.get(broker)
+                if bit is None:
+                    unknown[broker] = value
+                    continue
+                stock.tracked |= bit
+                if value:
+                    stock.available |= bit
+            if unknown:
+                extra['BrokerTracking'] = unknown
+        stock.extra = extra or None
+        return stock
+
+
+DEFAULTS = {field.name: field.default for field in fields(Stock)}
+# Record keys read into something other than `extra`
+OWN_KEYS = ('Brokers', 'Tracked Brokers', 'BrokerTracking', 'Price Updated')
+
+# A record with its brokers in the BrokerTracking layout, whichever one it was stored in
+def tracking_layout(record):
+    if 'Brokers' not in record:
+        return record
+    tracked = record.get('Tracked Brokers', ALL_BROKERS)
+    tracking = {broker: int(bool(record['Brokers'] & bit)) for broker, bit in BROKER_BITS.items() if tracked & bit}
+    tracking.update(record.get('BrokerTracking') or {})
+    layout = {key: value for key, value in record.items() if key not in ('Brokers', 'Tracked Brokers', 'BrokerTracking')}
+    layout['BrokerTracking'] = tracking
+    return layout
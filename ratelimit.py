@@ -0,0 +1,107 @@
+import asyncio
+import heapq
+import logging
+import time
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+class RateLimited(Exception):
+    pass
+
+# Token bucket shared by every Tradier call. Waiters are served by priority;
+# background work keeps a reserve free for commands and is shed if it waits too long.
+class RateLimiter:
+    def __init__(self, rate=120, per=60, background_reserve=20, background_max_wait=30, poll_interval=0.05):
+        self.capacity = rate
+        self.fill_rate = rate / per
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.background_reserve = background_reserve
+        self.background_max_wait = background_max_wait
+        self.poll_interval = poll_interval
+        self.available = None
+        self.expiry = None
+        self.waiters = []
+        self.sequence = 0
+        self.granted = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.delayed = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.shed = 0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    # Remaining budget: local bucket, capped by what Tradier last reported
+    def budget(self):
+        self.refill()
+        if self.available is not None and self.expiry is not None and time.time() < self.expiry:
+            return min(self.tokens, self.available)
+        return self.tokens
+
+    async def acquire(self, priority=BACKGROUND):
+        self.sequence += 1
+        entry = (priority, self.sequence)
+        heapq.heappush(self.waiters, entry)
+        deadline = None if priority == INTERACTIVE else time.monotonic() + self.background_max_wait
+        waited = False
+        try:
+            while True:
+                delay = self.try_take(entry)
+                if delay == 0:
+                    self.granted[priority] += 1
+                    if waited:
+                        self.delayed[priority] += 1
+                    return
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    self.shed += 1
+                    raise RateLimited("Tradier rate limit budget is reserved for commands.")
+                waited = True
+                await asyncio.sleep(delay)
+        finally:
+            if entry in self.waiters:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+
+    # 0 when the token was taken, otherwise seconds to wait before retrying
+    def try_take(self, entry):
+        if self.waiters[0] != entry:
+            return self.poll_interval
+        needed = 1 if entry[0] == INTERACTIVE else 1 + self.background_reserve
+        budget = self.budget()
+        if budget >= needed:
+            self.tokens -= 1
+            if self.available is not None:
+                self.available -= 1
+            heapq.heappop(self.waiters)
+            return 0
+        if self.available is not None and self.available < needed and self.expiry is not None:
+            return max(self.poll_interval, self.expiry - time.time())
+        return max(self.poll_interval, (needed - budget) / self.fill_rate)
+
+    # X-Ratelimit-* headers from a Tradier response
+    def update(self, headers, status=None):
+        try:
+            if 'X-Ratelimit-Available' in headers:
+                self.available = int(headers['X-Ratelimit-Available'])
+            if 'X-Ratelimit-Expiry' in headers:
+                self.expiry = int(headers['X-Ratelimit-Expiry']) / 1000
+        except ValueError:
+            logging.warning(f"Unexpected rate limit headers: {dict(headers)}")
+        if status == 429:
+            self.available = 0
+            if self.expiry is None or self.expiry <= time.time():
+                self.expiry = time.time() + 60
+            logging.warning("Tradier rate limit hit, holding requests until the window resets.")
+
+    def stats(self):
+        return {
+            'budget': round(self.budget(), 1),
+            'available': self.available,
+            'expiry': self.expiry,
+            'waiting': len(self.waiters),
+            'granted': dict(self.granted),
+            'delayed': dict(self.delayed),
+            'shed': self.shed
+        }
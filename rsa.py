@@ -1,156 +1,144 @@
 import logging
-import requests
-import json
 import asyncio
 import re
-from interactions import Client, OptionType, slash_command, SlashContext, Embed, EmbedField, EmbedAuthor
-from datetime import datetime, date
+import os
+import signal
+import tempfile
+from interactions.client.errors import HTTPException
+from interactions import Client, OptionType, listen, slash_command, component_callback, SlashContext, ComponentContext, AutocompleteContext, Embed, EmbedField, EmbedAuthor, ActionRow, Button, ButtonStyle, Attachment, File, Permissions, SlashCommand, ComponentCommand
+from datetime import datetime, date, timedelta
 from typing import Optional
-from secrets import DISCORD_TOKEN, TRADIER_API_KEY, DISCORD_GUILD, DISCORD_CHANN
-
-TAGS = ["CIL", "ROUNDED", "PENDING"]
-BROKERS = ["Fidelity", "Merrill Edge", "Robinhood", "Schwab", "Tastyworks", 
-           "Public", "Stocktwits", "Tradier", "Vanguard", "Ally", "Firstrade", 
-           "Plynk", "BBAE", "dSPAC", "Webull", "AInvest", "Fennel", "OptionsAI", 
-           "Chase", "Invstr+", "Wells Fargo", "Tornado", "SoFi"]
-DAILY_BROKERS = ["Schwab", "Tastyworks", "Public", "Stocktwits", "Firstrade", "Webull", "Tradier", "BBAE", "dSPAC", "AInvest", "Chase", "Invstr+", "Tornado", "SoFi"]
-EXCH_CODES = {
-    'A': 'NYSE MKT',
-    'B': 'NASDAQ OMX BX',
-    'C': 'National Stock Exchange',
-    'D': 'FINRA ADF',
-    'E': 'Market Independent (Generated by Nasdaq SIP)',
-    'F': 'Mutual Funds/Money Markets (NASDAQ)',
-    'I': 'International Securities Exchange',
-    'J': 'Direct Edge A',
-    'K': 'Direct Edge X',
-    'L': 'Long Term Stock Exchange',
-    'M': 'Chicago Stock Exchange',
-    'N': 'NYSE',
-    'P': 'NYSE Arca',
-    'Q': 'NASDAQ OMX',
-    'S': 'NASDAQ Small Cap',
-    'T': 'NASDAQ Int',
-    'U': 'OTCBB',
-    'V': 'OTC other',
-    'W': 'CBOE',
-    'X': 'NASDAQ OMX PSX',
-    'G': 'GLOBEX',
-    'Y': 'BATS Y-Exchange',
-    'Z': 'BATS'
-}
+from secrets import DISCORD_TOKEN, DISCORD_GUILD, DISCORD_CHANN
+import tradier
+import bulk
+from ratelimit import INTERACTIVE, BACKGROUND
+from cache import CompanyCache, QuoteCache, RenderCache
+from store import DocumentStore, open_backend, KEYS
+from archive import Archive, archive_exists
+from models import Stock, TAGS, BROKERS, DAILY_BROKERS, DAILY_MASK, broker_mask, valid_split_ratio, normalize_date
+from scheduler import RefreshScheduler, DEFAULT_INTERVALS
+from streaming import QuoteStream, STREAM_URL
+from search import PrefixIndex
+import metrics
+from metrics import registry
+import loopwatch
+import logsetup
 
 EMOJI_REDUDE = '<:9reddude:1126978459940433920>'
 EMOJI_GRDUDE = '<:9greendude:1126978105085546526>'
 
 bot = Client(token=DISCORD_TOKEN)
+STORAGE_BACKEND = "json"
 JSON_FILE = "stocks.json"
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s]: %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('log.txt')
-    ]
-)
+SQLITE_FILE = "stocks.db"
+JOURNAL_FILE = "stocks.journal"
+JOURNAL_COMPACT_AFTER = 500
+JSON_FLUSH_DELAY = 2
+ARCHIVE_ENABLED = True
+ARCHIVE_DIR = "archive"
+ARCHIVE_PERIOD = "month"
+ARCHIVE_SEGMENTS_LOADED = 8
+EXPORT_SPOOL_SIZE = 1024 * 1024
+IMPORT_ERRORS_SHOWN = 15
+COMPANY_CACHE_FILE = "companies.json"
+QUOTE_TTL = 60
+COMPANY_LOOKUP_CONCURRENCY = 5
+REFRESH_QUOTE_MAX_AGE = 10
+REFRESH_INTERVALS = DEFAULT_INTERVALS
+STREAMING_ENABLED = False
+METRICS_PORT = 9108
+METRICS_HOST = "127.0.0.1"
+WATCHDOG_ENABLED = False
+WATCHDOG_THRESHOLD = 0.25
+LOG_FILE = "log.txt"
+LOG_LEVEL = logging.INFO
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_ROTATE_WHEN = None
+
+log_listener = logsetup.setup_logging(LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUPS, LOG_ROTATE_WHEN)
+
+# SQLite already reads past plays by index, the archive is for the JSON files.
+# Plays archived while it was on move back into the past list when it is off.
+archive = Archive(ARCHIVE_DIR, ARCHIVE_PERIOD, ARCHIVE_SEGMENTS_LOADED) if STORAGE_BACKEND == "json" and ARCHIVE_ENABLED else None
+retired_archive = Archive(ARCHIVE_DIR, ARCHIVE_PERIOD) if archive is None and archive_exists(ARCHIVE_DIR) else None
+store = DocumentStore(open_backend(STORAGE_BACKEND, JSON_FILE, SQLITE_FILE, JOURNAL_FILE, JOURNAL_COMPACT_AFTER), flush_delay=JSON_FLUSH_DELAY, archive=archive, retired=retired_archive)
+store.load()
 
 def read_json_data(key):
-    with open(JSON_FILE, 'r') as file:
-        data = json.load(file)
-    return data[key]
+    return store.get(key)
 
 def write_json_data(key, data):
-    with open(JSON_FILE, 'r') as file:
-        full_data = json.load(file)
-    full_data[key] = data
-    with open(JSON_FILE, 'w') as file:
-        json.dump(full_data, file, indent=4)
-
-def write_stocks_json():
-    with open(JSON_FILE, 'w') as file:
-        json.dump({"rsa": [], "research": [], "past": []}, file, indent=4)
-        logging.info("Blank JSON initialized.")
-        
-try:
-    with open(JSON_FILE, 'r') as file:
-        try:
-            json.load(file)
-        except json.JSONDecodeError:
-            write_stocks_json()
-except FileNotFoundError:
-    write_stocks_json()
-    
-            
-
-# Price lookup
-def get_current_price(ticker):
-    url = f"https://api.tradier.com/v1/markets/quotes?symbols={ticker}"
-    headers = {"Authorization": f"Bearer {TRADIER_API_KEY}", "Accept": "application/json"}
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        quote = data.get('quotes', {}).get('quote')
-        if quote:
-            return quote.get('last', 'null')
-        raise KeyError("The response data did not contain the expected fields.")
-    except requests.RequestException as e:
-        logging.error(f"Price not found for {ticker}: {e}")
-        return 'null'
-    except KeyError as e:
-        logging.error(f"The response data did not contain the expected fields: {e}")
-        return 'null'
-
-# Ticker lookup
-def get_company_name(ticker):
-    url = f"https://api.tradier.com/v1/markets/lookup?q={ticker}"
-    headers = {"Authorization": f"Bearer {TRADIER_API_KEY}", "Accept": "application/json"}
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        logging.info(f"Successfully received a response for {ticker}. Status Code: {response.status_code}")
-        
-        data = response.json()
-        logging.info(f"API Response: {data}")
-        
-        securities = data.get('securities')
-        if securities:
-            security_list = securities.get('security')
-            if isinstance(security_list, list):
-                for security in security_list:
-                    if security.get('symbol') == ticker:
-                        exchange_code = security.get('exchange', 'null')
-                        exchange_name = EXCH_CODES.get(exchange_code, 'Unknown')
-                        return f"({security.get('description', 'null')} @ {exchange_name})"
-            elif isinstance(security_list, dict):
-                if security_list.get('symbol') == ticker:
-                    exchange_code = security_list.get('exchange', 'null')
-                    exchange_name = EXCH_CODES.get(exchange_code, 'Unknown')
-                    return f"({security_list.get('description', 'null')} @ {exchange_name})"
-        
-        logging.error("The response data did not contain the expected fields.")
-        raise KeyError("The response data did not contain the expected fields.")
-        
-    except requests.RequestException as e:
-        logging.error(f"Company info not found for {ticker}. HTTP Request Exception: {e}")
-        return 'null'
-        
-    except KeyError as e:
-        logging.error(f"The response data did not contain the expected fields: {e}")
-        return 'null'
-
-# Update prices
-async def update_stock_prices():
-    while True:
-        stock_data = read_json_data("rsa")
-        for stock in stock_data:
-            ticker = stock['Ticker']
-            price = get_current_price(ticker)
-            if price is not None:
-                stock['Current Price'] = price
-        write_json_data("rsa", stock_data)
-        await asyncio.sleep(120)
+    store.set(key, data)
+
+company_cache = CompanyCache(COMPANY_CACHE_FILE)
+quote_cache = QuoteCache(tradier.get_current_prices, ttl=QUOTE_TTL)
+render_cache = RenderCache()
+ticker_index = PrefixIndex(store, company_cache)
+metrics_server = None
+watchdog = loopwatch.LoopWatchdog(threshold=WATCHDOG_THRESHOLD)
+
+# Gauges read only when /metrics is scraped or /stats runs
+def cache_counts(attribute):
+    caches = {"quotes": quote_cache, "companies": company_cache, "renders": render_cache}
+    return lambda: [({"cache": name}, getattr(cache, attribute)) for name, cache in caches.items()]
+
+def limiter_counts(kind):
+    counts = tradier.limiter.stats()[kind]
+    return [({"priority": "interactive"}, counts[INTERACTIVE]), ({"priority": "background"}, counts[BACKGROUND])]
+
+def store_file_sizes():
+    sizes = [({"file": os.path.basename(path)}, os.path.getsize(path)) for path in store.backend.files() if os.path.exists(path)]
+    if archive is not None:
+        sizes.append(({"file": ARCHIVE_DIR}, sum(os.path.getsize(path) for path in archive.files() if os.path.exists(path))))
+    return sizes
+
+registry.describe("rsa_command_seconds", "histogram", "Slash command and button handler latency")
+registry.describe("rsa_command_errors_total", "counter", "Slash command and button handlers that raised")
+registry.collect("rsa_cache_hits_total", "counter", "Cache lookups served from memory", cache_counts("hits"))
+registry.collect("rsa_cache_misses_total", "counter", "Cache lookups that had to fetch or render", cache_counts("misses"))
+registry.collect("rsa_store_file_bytes", "gauge", "Size of the stock data files", store_file_sizes)
+registry.collect("rsa_store_records", "gauge", "Records per list", lambda: [({"list": key}, store.count(key)) for key in KEYS])
+registry.collect("rsa_archive_segments", "gauge", "Archive segments on disk and loaded in memory",
+                 lambda: [({"state": "stored"}, len(archive.counts)), ({"state": "loaded"}, len(archive.loaded))] if archive is not None else None)
+registry.collect("rsa_quote_fetches_coalesced_total", "counter", "Quote lookups that waited on a fetch already in flight", lambda: quote_cache.coalesced)
+registry.collect("tradier_rate_limit_budget", "gauge", "Requests the local limiter would allow right now", lambda: tradier.limiter.budget())
+registry.collect("tradier_rate_limit_granted_total", "counter", "Requests let through by the local limiter, by priority", lambda: limiter_counts('granted'))
+registry.collect("tradier_rate_limit_delayed_total", "counter", "Requests that had to wait for the local limiter, by priority", lambda: limiter_counts('delayed'))
+registry.collect("tradier_rate_limit_shed_total", "counter", "Background requests dropped after waiting too long", lambda: tradier.limiter.stats()['shed'])
+registry.collect("tradier_rate_limit_waiting", "gauge", "Requests waiting for the local limiter", lambda: tradier.limiter.stats()['waiting'])
+registry.collect("rsa_stream_connected", "gauge", "1 while the quote stream is connected", lambda: int(quote_stream.status()['connected']))
+registry.collect("rsa_stream_symbols", "gauge", "Symbols subscribed on the quote stream", lambda: quote_stream.status()['symbols'])
+registry.collect("rsa_stream_events_total", "counter", "Trade events received from the quote stream", lambda: quote_stream.status()['events'])
+registry.collect("rsa_stream_reconnects_total", "counter", "Quote stream reconnects", lambda: quote_stream.status()['reconnects'])
+
+# Cached company lookup
+async def get_company_name(ticker):
+    company = company_cache.get(ticker)
+    if company is None:
+        company = await tradier.lookup_company(ticker)
+        if company is None:
+            return 'null'
+        company_cache.put(ticker, company)
+    return tradier.format_company(company)
+
+# All company names for a bulletin at once, a few lookups at a time
+async def prefetch_company_names(tickers):
+    semaphore = asyncio.Semaphore(COMPANY_LOOKUP_CONCURRENCY)
+
+    async def lookup(ticker):
+        async with semaphore:
+            return await get_company_name(ticker)
+
+    tickers = list(dict.fromkeys(tickers))
+    results = await asyncio.gather(*(lookup(ticker) for ticker in tickers), return_exceptions=True)
+    names = {}
+    for ticker, result in zip(tickers, results):
+        if isinstance(result, Exception):
+            logging.error(f"Company lookup failed for {ticker}: {result!r}")
+            result = 'null'
+        names[ticker] = result
+    return names
 
 # Calculate profit
 def calculate_estimated_profit(price: float, split_ratio: str) -> float:
@@ -158,20 +146,147 @@ def calculate_estimated_profit(price: float, split_ratio: str) -> float:
     estimated_profit = round(price * split_ratio_num, 2)
     return estimated_profit
 
-# Auto updates profit
-async def auto_estimated_profit():
-    while True:
-        stock_data = read_json_data("rsa")
-        for stock in stock_data:
-            ticker = stock['Ticker']
-            price = get_current_price(ticker)
-            if price is not None:
-                split_ratio = stock['Split Ratio']
-                split_ratio_num = float(split_ratio.split(":")[1]) - 1
-                estimated_profit = round(price * split_ratio_num, 2)
-                stock['Estimated Profit'] = estimated_profit
-        write_json_data("rsa", stock_data)
-        await asyncio.sleep(180)
+def set_price(stock, price):
+    stock.current_price = price
+    stock.estimated_profit = calculate_estimated_profit(price, stock.split_ratio)
+    stock.price_updated = datetime.now().isoformat(timespec='seconds')
+
+def price_updated_at(stock):
+    try:
+        return datetime.fromisoformat(stock.price_updated)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def price_as_of(stock):
+    updated = price_updated_at(stock)
+    if updated is None:
+        return "as of unknown"
+    if updated.date() == date.today():
+        return f"as of {updated.strftime('%H:%M')}"
+    return f"as of {updated.strftime('%m-%d %H:%M')}"
+
+def is_price_stale(stock):
+    updated = price_updated_at(stock)
+    return updated is None or (datetime.now() - updated).total_seconds() > QUOTE_TTL
+
+# Tickers to keep priced, flagged hot when they split today or tomorrow
+def refresh_targets():
+    today = date.today()
+    hot = {stock.ticker.upper() for stock in store.between(today, today + timedelta(days=1))}
+    streamed = quote_stream.live_symbols()
+    return {ticker: ticker in hot for ticker in active_tickers() if ticker not in streamed}
+
+def active_tickers():
+    return [stock.ticker.upper() for stock in read_json_data("rsa")]
+
+# Update price and estimated profit in one pass
+async def refresh_prices(tickers):
+    quotes, missing = await quote_cache.get_many(tickers, max_age=REFRESH_QUOTE_MAX_AGE, priority=BACKGROUND)
+    due = set(tickers)
+    updated = []
+    for stock in read_json_data("rsa"):
+        ticker = stock.ticker.upper()
+        if ticker not in due:
+            continue
+        price = tradier.quote_price(quotes.get(ticker))
+        if price is not None:
+            set_price(stock, price)
+            updated.append(stock)
+    store.prices_updated("rsa", updated)
+    return missing
+
+# Serve the last known price now, refresh stale active plays in the background
+revalidations = set()
+
+def revalidate(stocks):
+    tickers = [stock.ticker.upper() for stock in stocks if is_price_stale(stock)]
+    if not tickers:
+        return
+    task = asyncio.get_running_loop().create_task(refresh_prices(tickers))
+    revalidations.add(task)
+    task.add_done_callback(revalidations.discard)
+
+# Trade and quote events from the market stream
+def apply_stream_event(event):
+    symbol = event['symbol'].upper()
+    if event.get('type') == 'trade':
+        price = float(event['price'])
+        quote_cache.update(symbol, last=price)
+        matches = store.find(symbol, ("rsa",))
+        for key, stock in matches:
+            set_price(stock, price)
+        if matches:
+            store.prices_streamed("rsa", [stock for key, stock in matches])
+    elif event.get('type') == 'quote':
+        quote_cache.update(symbol, bid=float(event['bid']), ask=float(event['ask']))
+
+scheduler = RefreshScheduler(refresh_prices, refresh_targets, REFRESH_INTERVALS)
+quote_stream = QuoteStream(active_tickers, apply_stream_event, STREAM_URL, on_disconnect=scheduler.wake)
+
+# Active list changed: pick up new tickers right away
+def active_tickers_changed():
+    scheduler.wake()
+    quote_stream.resubscribe()
+
+# Acknowledge within Discord's 3s window; results follow when ready
+async def acknowledge(ctx, ephemeral=False):
+    if not ctx.deferred and not ctx.responded:
+        await ctx.defer(ephemeral=ephemeral)
+
+# Announcement channels, resolved once and refetched only after a failure
+channels = {}
+
+async def get_channel(channel_id, refresh=False):
+    if refresh or channel_id not in channels:
+        channel = await bot.fetch_channel(channel_id, force=refresh)
+        if channel is None:
+            channels.pop(channel_id, None)
+            raise ValueError(f"Channel {channel_id} not found.")
+        channels[channel_id] = channel
+    return channels[channel_id]
+
+async def send_to_channel(channel_id, message):
+    try:
+        channel = await get_channel(channel_id)
+        await channel.send(message)
+    except HTTPException as e:
+        logging.warning(f"Send to channel {channel_id} failed, refetching it: {e}")
+        channel = await get_channel(channel_id, refresh=True)
+        await channel.send(message)
+
+# Send to every channel at once; one bad channel doesn't hold up the rest
+async def broadcast(message, channel_ids=None):
+    channel_ids = DISCORD_CHANN if channel_ids is None else channel_ids
+    results = await asyncio.gather(*(send_to_channel(channel_id, message) for channel_id in channel_ids), return_exceptions=True)
+    failed = []
+    for channel_id, result in zip(channel_ids, results):
+        if isinstance(result, Exception):
+            logging.error(f"Announcement to channel {channel_id} failed: {result!r}")
+            failed.append(channel_id)
+    return failed
+
+async def load_channels():
+    results = await asyncio.gather(*(get_channel(channel_id) for channel_id in DISCORD_CHANN), return_exceptions=True)
+    for channel_id, result in zip(DISCORD_CHANN, results):
+        if isinstance(result, Exception):
+            logging.error(f"Could not resolve announcement channel {channel_id}: {result!r}")
+
+@listen()
+async def on_startup():
+    global metrics_server
+    if WATCHDOG_ENABLED:
+        watchdog.start()
+    scheduler.start()
+    # Once here rather than on the first keystroke; kept current from then on
+    ticker_index.refresh()
+    if METRICS_PORT is not None and metrics_server is None:
+        try:
+            metrics_server = await metrics.start_server(METRICS_PORT, METRICS_HOST)
+        except OSError as e:
+            logging.error(f"Metrics endpoint could not listen on {METRICS_HOST}:{METRICS_PORT}: {e}")
+    await load_channels()
+    if STREAMING_ENABLED:
+        quote_stream.start()
 
 # Search RSA
 @slash_command(
@@ -187,19 +302,10 @@ async def auto_estimated_profit():
     ]
 )
 async def rsa_stock(ctx: SlashContext, ticker: str):
-    with open(JSON_FILE, 'r') as file:
-        full_data = json.load(file)
-    stock_data = full_data["rsa"]
-    past_stock_data = full_data["past"]
-
-    found_stock = None
-    for stock in stock_data + past_stock_data:
-        if stock['Ticker'].lower() == ticker.lower():
-            found_stock = stock
-            break
+    found_in, found_stock = store.find_one(ticker, ("rsa", "past"))
 
     if found_stock:
-        tag = found_stock['Tag'].upper()
+        tag = found_stock.tag.upper()
         tag_color = ""
         if tag == "PENDING":
             tag_color = "ffe100"
@@ -208,35 +314,179 @@ async def rsa_stock(ctx: SlashContext, ticker: str):
         elif tag == "CIL":
             tag_color = "cc0000"
 
-        current_price = f"${found_stock['Current Price']}"
-        estimated_profit = f"${found_stock['Estimated Profit']}"
+        current_price = f"${found_stock.current_price}"
+        estimated_profit = f"${found_stock.estimated_profit}"
 
-        broker_tracking = found_stock['BrokerTracking']
         broker_list = ""
-        for broker, value in broker_tracking.items():
+        for broker, value in found_stock.broker_tracking().items():
             if value == 0:
                 broker_list += f":x: {broker}\n"
             else:
                 broker_list += f":white_check_mark: {broker}\n"
 
         embed = Embed(
-            title=f"${found_stock['Ticker']} - {tag}",
+            title=f"${found_stock.ticker} - {tag}",
             color=int(tag_color, 16),
         )
-        embed.add_field(name="Current Price", value=f"`{current_price}`", inline=False)
-        embed.add_field(name="Split", value=f"`{found_stock['Split Ratio']}`", inline=False)
-        embed.add_field(name="Date of Split", value=f"`{found_stock['Date']}`", inline=False)
+        embed.add_field(name="Current Price", value=f"`{current_price}` ({price_as_of(found_stock)})", inline=False)
+        embed.add_field(name="Split", value=f"`{found_stock.split_ratio}`", inline=False)
+        embed.add_field(name="Date of Split", value=f"`{found_stock.date}`", inline=False)
         embed.add_field(name="Estimated Profit", value=f"`{estimated_profit}`", inline=False)
         embed.add_field(name="Shares Availability", value=broker_list, inline=False)
-        embed.add_field(name=found_stock['Comments'] if found_stock['Comments'] else 'Get that bread :money_mouth:', value=f"[Source]({found_stock['Source']})", inline=False)
+        embed.add_field(name=found_stock.comments if found_stock.comments else 'Get that bread :money_mouth:', value=f"[Source]({found_stock.source})", inline=False)
 
         await ctx.send(embed=embed, ephemeral=True)
+        if found_in == "rsa":
+            revalidate([found_stock])
         logging.info(f"RSA '{ticker}' found and sent to Discord. Requested by {ctx.member.display_name}.")
     else:
         await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
         logging.warning(f"RSA '{ticker}' not found. Requested by {ctx.member.display_name}.")
 
 
+def oldest_price_as_of(stocks):
+    return price_as_of(min(stocks, key=lambda stock: price_updated_at(stock) or datetime.min))
+
+# Bulletin layout: several embeds per message, further messages behind buttons
+STOCKS_PER_EMBED = 5
+EMBEDS_PER_MESSAGE = 3
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+MESSAGE_CHARACTER_LIMIT = 6000
+
+def today_fields(stock, company_name):
+    ticker_name = f"**${stock.ticker.upper()}** {company_name}"
+    ta_name = f"TA is {stock.transfer_agent}" if stock.transfer_agent else "TA not listed"
+    return [
+        ["\u200b", ticker_name, False],
+        ["Split", f"\u200b{stock.split_ratio}", True],
+        ["Price", f"\u200b${stock.current_price}", True],
+        ["Profit", f"\u200b${stock.estimated_profit}", True],
+        [stock.comments if stock.comments else 'Get that bread :money_mouth:', ta_name, False, f"\n[Source]({stock.source})"]
+    ]
+
+def upcoming_fields(stock, company_name):
+    ticker_name = f"**${stock.ticker.upper()}** {company_name}"
+    post_text = f"{ticker_name}\nSplit: {stock.split_ratio}\nPrice: ${stock.current_price}\nEstimated Profit: ${stock.estimated_profit}\nDate: {stock.date}\nTransfer Agent: {stock.transfer_agent if stock.transfer_agent else 'TA not listed'}"
+    if stock.comments:
+        post_text += f"\n{stock.comments}"
+    return [["\u200b", post_text, False, f"\n[Source]({stock.source})"]]
+
+BULLETINS = {
+    "today": {"title": "Today's RSA Bulletin", "color": 0x35e20d, "ephemeral": False, "fields": today_fields},
+    "upcoming": {"title": "Upcoming RSA Bulletin", "color": 0x3498db, "ephemeral": True, "fields": upcoming_fields}
+}
+
+def bulletin_stocks(view, days=None):
+    today = date.today()
+    if view == "today":
+        return store.on_date(today)
+    if days is None:
+        return store.between()
+    return store.between(today, today + timedelta(days=days))
+
+def bulletin_page_count(stocks):
+    total_embeds = (len(stocks) + STOCKS_PER_EMBED - 1) // STOCKS_PER_EMBED
+    return max(1, (total_embeds + EMBEDS_PER_MESSAGE - 1) // EMBEDS_PER_MESSAGE)
+
+def page_stocks(stocks, page):
+    start_index = page * EMBEDS_PER_MESSAGE * STOCKS_PER_EMBED
+    return stocks[start_index:start_index + EMBEDS_PER_MESSAGE * STOCKS_PER_EMBED]
+
+def truncate(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:max(limit - 3, 0)] + "..."
+
+# Shrink the longest texts until a stock fits its share of the message. A
+# field's optional fourth item is a tail kept whole after its value (the
+# source link); the comments and transfer agent in that field go first.
+def fit_fields(fields, budget):
+    fields = [list(field) + [""] * (4 - len(field)) for field in fields]
+    fields = [[truncate(name, FIELD_NAME_LIMIT), truncate(value, FIELD_VALUE_LIMIT - len(tail)), inline, tail] for name, value, inline, tail in fields]
+    while True:
+        excess = sum(len(name) + len(value) + len(tail) for name, value, _, tail in fields) - budget
+        if excess <= 0:
+            break
+        candidates = [(field, index) for field in fields for index in (0, 1) if len(field[index]) > 20]
+        if not candidates:
+            break
+        field, index = max(candidates, key=lambda item: (bool(item[0][3]), len(item[0][item[1]])))
+        field[index] = truncate(field[index], max(20, len(field[index]) - excess))
+    return [(name, value + tail, inline) for name, value, inline, tail in fields]
+
+def render_bulletin_page(view, stocks, page, names):
+    bulletin = BULLETINS[view]
+    total_embeds = (len(stocks) + STOCKS_PER_EMBED - 1) // STOCKS_PER_EMBED
+    first_embed = page * EMBEDS_PER_MESSAGE
+    parts = []
+    for embed_number in range(first_embed, min(first_embed + EMBEDS_PER_MESSAGE, total_embeds)):
+        stocks_subset = stocks[embed_number * STOCKS_PER_EMBED:(embed_number + 1) * STOCKS_PER_EMBED]
+        title = bulletin['title'] + (f" - Page {embed_number + 1}/{total_embeds}" if total_embeds > 1 else "")
+        footer = f"Prices {oldest_price_as_of(stocks_subset)}"
+        parts.append((title, footer, stocks_subset))
+
+    overhead = sum(len(title) + len(footer) for title, footer, _ in parts)
+    share = (MESSAGE_CHARACTER_LIMIT - overhead) // sum(len(stocks_subset) for _, _, stocks_subset in parts)
+    embeds = []
+    for title, footer, stocks_subset in parts:
+        embed = Embed(title=title, color=bulletin['color'])
+        for stock in stocks_subset:
+            for name, value, inline in fit_fields(bulletin['fields'](stock, names[stock.ticker]), share):
+                embed.add_field(name=name, value=value, inline=inline)
+        embed.set_footer(text=footer)
+        embeds.append(embed)
+    return embeds
+
+# Pages are rendered on demand and cached until the data or prices change
+async def get_bulletin_page(view, stocks, page, days=None):
+    cache_key = (view, date.today(), days, page, store.version, store.price_epoch)
+    embeds = render_cache.get(cache_key)
+    if embeds is not None:
+        return embeds
+    subset = page_stocks(stocks, page)
+    names = await prefetch_company_names([stock.ticker for stock in subset])
+    embeds = render_bulletin_page(view, stocks, page, names)
+    if 'null' not in names.values():
+        render_cache.put(cache_key, embeds)
+    company_cache.save_later()
+    return embeds
+
+def bulletin_buttons(view, days, page, total_pages):
+    if total_pages <= 1:
+        return []
+    custom_id = f"bulletin:{view}:{'' if days is None else days}"
+    return [ActionRow(
+        Button(style=ButtonStyle.SECONDARY, label="Prev", custom_id=f"{custom_id}:{page - 1}", disabled=page == 0),
+        Button(style=ButtonStyle.SECONDARY, label=f"{page + 1}/{total_pages}", custom_id=f"{custom_id}:{page}", disabled=True),
+        Button(style=ButtonStyle.SECONDARY, label="Next", custom_id=f"{custom_id}:{page + 1}", disabled=page >= total_pages - 1)
+    )]
+
+async def send_bulletin(ctx, view, stocks, days=None):
+    bulletin = BULLETINS[view]
+    await acknowledge(ctx, ephemeral=bulletin['ephemeral'])
+    total_pages = bulletin_page_count(stocks)
+    embeds = await get_bulletin_page(view, stocks, 0, days)
+    logging.info(f"Sending {bulletin['title']} - Page 1/{total_pages}")
+    await ctx.send(embeds=embeds, components=bulletin_buttons(view, days, 0, total_pages), ephemeral=bulletin['ephemeral'])
+    revalidate(stocks)
+
+# Prev/Next buttons render the requested page only
+@component_callback(re.compile(r"^bulletin:"))
+async def bulletin_page(ctx: ComponentContext):
+    _, view, days, page = ctx.custom_id.split(":")
+    days = int(days) if days else None
+    await ctx.defer(edit_origin=True)
+    stocks = bulletin_stocks(view, days)
+    if not stocks:
+        await ctx.edit_origin(content=f"Nothing {EMOJI_REDUDE}", embeds=[], components=[])
+        return
+    total_pages = bulletin_page_count(stocks)
+    page = max(0, min(int(page), total_pages - 1))
+    embeds = await get_bulletin_page(view, stocks, page, days)
+    logging.info(f"Sending {BULLETINS[view]['title']} - Page {page + 1}/{total_pages}. Requested by {ctx.author.display_name}.")
+    await ctx.edit_origin(embeds=embeds, components=bulletin_buttons(view, days, page, total_pages))
+
+
 # Todays bulletin
 @slash_command(
     name="today",
@@ -248,100 +498,39 @@ async def list_stocks(ctx: SlashContext):
         await ctx.send(f"Nothing {EMOJI_REDUDE}")
         logging.info("Today's RSA Bulletin: No stocks found. Requested by {ctx.member.display_name}.")
         return
-    today = date.today()
-    filtered_stocks = []
-    for stock in stock_data:
-        stock_date = datetime.strptime(stock['Date'], "%m-%d-%Y").date()
-        if stock_date == today:
-            filtered_stocks.append(stock)
-            
+    filtered_stocks = bulletin_stocks("today")
     if not filtered_stocks:
         await ctx.send(f"Nothing {EMOJI_REDUDE}")
         logging.info("Today's RSA Bulletin: No RSAs yet. Requested by {ctx.member.display_name}.")
         return
-        
-    total_stocks = len(filtered_stocks)
-    stocks_per_embed = 5
-    total_embeds = (total_stocks + stocks_per_embed - 1) // stocks_per_embed
-    for embed_number in range(total_embeds):
-        start_index = embed_number * stocks_per_embed
-        end_index = min(start_index + stocks_per_embed, total_stocks)
-        stocks_subset = filtered_stocks[start_index:end_index]
-        embed = Embed(
-            title=f"Today's RSA Bulletin" + (f" - Page {embed_number + 1}/{total_embeds}" if total_embeds > 1 else ""),
-            color=0x35e20d
-        )
-        for stock in stocks_subset:
-            company_name = get_company_name(stock['Ticker'])
-            ticker_name = f"**${stock['Ticker'].upper()}** {company_name}"
-            ta_name = f"TA is {stock['Transfer Agent']}" if stock.get('Transfer Agent') else "TA not listed"
-            comment = stock['Comments'][:253] + "..." if len(stock['Comments']) > 256 else stock['Comments']
-            post_text = f"{ticker_name}\nSplit: {stock['Split Ratio']}\nPrice: ${stock['Current Price']}\nProfit: ${stock['Estimated Profit']}\n{stock['Comments'] if stock['Comments'] else 'No comments'}\n{stock['Transfer Agent'] if stock['Transfer Agent'] else 'TA not listed'}\n[Source]({stock['Source']})"
-            character_count = len(post_text)
-            logging.info(f"Character count: {character_count}")
-            if character_count > 2000:
-                await ctx.send("Character limit exceeded. This is a bot issue.", ephemeral=True)
-                logging.error("The post exceeds the character limit. Requested by {ctx.member.display_name}.")
-                return
-            
-            embed.add_field(name="\u200b", value=ticker_name, inline=False)
-            embed.add_field(name="Split", value=f"\u200b{stock['Split Ratio']}", inline=True)
-            embed.add_field(name="Price", value=f"\u200b${stock['Current Price']}", inline=True)
-            embed.add_field(name="Profit", value=f"\u200b${stock['Estimated Profit']}", inline=True)
-            embed.add_field(name=comment if stock['Comments'] else 'Get that bread :money_mouth:', value=f"{ta_name}\n[Source]({stock['Source']})", inline=False)
-
-        logging.info(f"Sending Today's RSA Bulletin - Page {embed_number + 1}/{total_embeds}")
-        await ctx.send(embed=embed)
-
-    logging.info("Today's RSA Bulletin sent successfully. Requested by {ctx.member.display_name}.")
+
+    await send_bulletin(ctx, "today", filtered_stocks)
+    logging.info(f"Today's RSA Bulletin sent successfully. Requested by {ctx.member.display_name}.")
 
 
 # Upcoming RSA
 @slash_command(
     name="upcoming",
-    description="Upcoming RSA Bulletin"
+    description="Upcoming RSA Bulletin",
+    options=[
+        {
+            "name": "days",
+            "description": "Only show plays in the next N days",
+            "type": OptionType.INTEGER,
+            "required": False,
+            "min_value": 0
+        }
+    ]
 )
-async def list_upcoming_stocks(ctx: SlashContext):
-    stock_data = read_json_data("rsa")
-    if not stock_data:
-        await ctx.send("Nothing {EMOJI_REDUDE}")
+async def list_upcoming_stocks(ctx: SlashContext, days: Optional[int] = None):
+    sorted_stocks = bulletin_stocks("upcoming", days)
+    if not sorted_stocks:
+        await ctx.send(f"Nothing {EMOJI_REDUDE}")
         logging.info("Upcoming RSA Bulletin: No RSAs found. Requested by {ctx.member.display_name}.")
         return
 
-    total_stocks = len(stock_data)
-    stocks_per_embed = 5
-    total_embeds = (total_stocks + stocks_per_embed - 1) // stocks_per_embed
-    sorted_stocks = sorted(stock_data, key=lambda x: datetime.strptime(x['Date'], "%m-%d-%Y"))
-
-    for embed_number in range(total_embeds):
-        start_index = embed_number * stocks_per_embed
-        end_index = min(start_index + stocks_per_embed, total_stocks)
-        stocks_subset = sorted_stocks[start_index:end_index]
-        embed = Embed(
-            title=f"Upcoming RSA Bulletin" + (f" - Page {embed_number + 1}/{total_embeds}" if total_embeds > 1 else ""),
-            color=0x3498db
-        )
-        for stock in stocks_subset:
-            company_name = get_company_name(stock['Ticker'])
-            ticker_name = f"**${stock['Ticker'].upper()}** {company_name}"
-            post_text = f"{ticker_name}\nSplit: {stock['Split Ratio']}\nPrice: ${stock['Current Price']}\nEstimated Profit: ${stock['Estimated Profit']}\nDate: {stock['Date']}\nTransfer Agent: {stock['Transfer Agent'] if stock['Transfer Agent'] else 'TA not listed'}"
-            if stock['Comments']:
-                post_text += f"\n{stock['Comments']}"
-            post_text += f"\n[Source]({stock['Source']})"
-            embed.add_field(name="\u200b", value=post_text, inline=False)
-
-        character_count = len(embed.to_dict()["fields"][0]["value"])
-        logging.info(f"Character count: {character_count}")
-
-        if character_count > 2000:
-            await ctx.send("Character limit exceeded. This is a bot issue.", ephemeral=True)
-            logging.error("The post exceeds the character limit. Requested by {ctx.member.display_name}.")
-            return
-
-        logging.info(f"Sending Upcoming RSA Bulletin - Page {embed_number + 1}/{total_embeds}")
-        await ctx.send(embed=embed, ephemeral=True)
-
-    logging.info("Upcoming RSA Bulletin sent successfully. Requested by {ctx.member.display_name}.")
+    await send_bulletin(ctx, "upcoming", sorted_stocks, days)
+    logging.info(f"Upcoming RSA Bulletin sent successfully. Requested by {ctx.member.display_name}.")
 
 
 # New RSA
@@ -388,28 +577,26 @@ async def list_upcoming_stocks(ctx: SlashContext):
     ]
 )
 async def add_stock(ctx: SlashContext, ticker: str, split_ratio: str, source: str, date: Optional[str] = None, agent: Optional[str] = None, comments: Optional[str] = ""):
-    if not re.match(r'^1:\d+(\.\d+)?$', split_ratio):
+    if not valid_split_ratio(split_ratio):
         await ctx.send("Invalid split ratio. Format should be like '1:10'.", ephemeral=True)
         return
 
-    if date is None:
-        date = datetime.now().strftime("%m-%d-%Y")
-    else:
-        try:
-            parsed_date = datetime.strptime(date, "%m-%d-%Y")
-            date = parsed_date.strftime("%m-%d-%Y")
-        except ValueError:
-            await ctx.send("Invalid date format. Please use 'MM-DD-YYYY'.", ephemeral=True)
-            return
+    try:
+        date = normalize_date(date)
+    except ValueError:
+        await ctx.send("Invalid date format. Please use 'MM-DD-YYYY'.", ephemeral=True)
+        return
 
     ticker = ticker.upper()
-    stock_data = read_json_data("rsa")
 
-    if any(stock["Ticker"].upper() == ticker for stock in stock_data):
+    if store.find(ticker, ("rsa",)):
         await ctx.send(f"RSA '{ticker}' already exists.", ephemeral=True)
         return
-    
-    price = get_current_price(ticker)
+
+    # Deferred privately so a failed lookup stays private; the announcement
+    # below goes out as a public follow-up
+    await acknowledge(ctx, ephemeral=True)
+    price = await quote_cache.get_price(ticker, priority=INTERACTIVE)
     if price is not None:
         price = round(price, 2)
     else:
@@ -418,25 +605,24 @@ async def add_stock(ctx: SlashContext, ticker: str, split_ratio: str, source: st
 
     estimated_profit = calculate_estimated_profit(price, split_ratio)
 
-    new_stock = {
-        'Ticker': ticker,
-        'Current Price': price,
-        'Split Ratio': split_ratio,
-        'Date': date,
-        'Estimated Profit': estimated_profit,
-        'Source': source,
-        'Transfer Agent': agent,
-        'Comments': comments,
-        'Tag': 'pending',
-        'BrokerTracking': {broker: 0 for broker in BROKERS}
-    }
-
-    stock_data.append(new_stock)
-    write_json_data("rsa", stock_data)
-    if not asyncio.get_event_loop().is_running():
-        asyncio.get_event_loop().create_task(update_stock_prices())
+    new_stock = Stock(
+        ticker=ticker,
+        current_price=price,
+        split_ratio=split_ratio,
+        date=date,
+        estimated_profit=estimated_profit,
+        source=source,
+        transfer_agent=agent,
+        comments=comments,
+        tag='pending',
+        price_updated=datetime.now().isoformat(timespec='seconds')
+    )
+
+    store.add("rsa", new_stock)
+    active_tickers_changed()
 
     logging.info(f"RSA '{ticker}' added successfully. Requested by {ctx.member.display_name}.")
+    await ctx.send(f"RSA '{ticker}' added.", ephemeral=True)
     date_datetime = datetime.strptime(date, "%m-%d-%Y")
     today_datetime = datetime.now()
 
@@ -444,11 +630,11 @@ async def add_stock(ctx: SlashContext, ticker: str, split_ratio: str, source: st
         message = f" ${ticker} is doing a R/S today. Curently trading for ${price}. Estimated profit of ~${estimated_profit}.\n{source}"
         await ctx.send(message)
         await list_stocks(ctx)
-        for channel_id in DISCORD_CHANN:
-            channel = await ctx.bot.fetch_channel(channel_id)
-            await channel.send(message)
+        await broadcast(message)
     elif date_datetime.date() > today_datetime.date():
         await ctx.send(f"${ticker} has been added, last day to buy is {date}. Estimated profit of ~${estimated_profit}.")
+    else:
+        await ctx.send(f"${ticker} has been added.")
 
 
 # Modify stock
@@ -515,79 +701,65 @@ async def add_stock(ctx: SlashContext, ticker: str, split_ratio: str, source: st
     ]
 )
 async def edit_stock(ctx: SlashContext, ticker: str, split_ratio: str = None, date: str = None, source: str = None, comments: str = None, tag: str = None, agent: str = None):
-    rsa_data = read_json_data("rsa")
-    past_data = read_json_data("past")
-    all_data = rsa_data + past_data 
-
-    if split_ratio is not None and not re.match(r'^1:\d+(\.\d+)?$', split_ratio):
+    if split_ratio is not None and not valid_split_ratio(split_ratio):
         await ctx.send("Invalid split ratio. Format should be like '1:10'.", ephemeral=True)
         return
 
-    if date is None:
-        date = datetime.now().strftime("%m-%d-%Y")
+    try:
+        date = normalize_date(date)
+    except ValueError:
+        await ctx.send("Invalid date format. Please use 'MM-DD-YYYY'.", ephemeral=True)
+        return
+
+    array_found_in, stock = store.find_one(ticker, ("rsa", "past"))
+    if stock is None:
+        logging.warning(f"RSA '{ticker}' not found. Requested by {ctx.member.display_name}.")
+        await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
+        return
+
+    # Fetch before touching the record, it lives in the in-memory store
+    await acknowledge(ctx, ephemeral=True)
+    price = await quote_cache.get_price(ticker, priority=INTERACTIVE)
+    if price is not None:
+        price = round(price, 2)
     else:
-        try:
-            parsed_date = datetime.strptime(date, "%m-%d-%Y")
-            date = parsed_date.strftime("%m-%d-%Y")
-        except ValueError:
-            await ctx.send("Invalid date format. Please use 'MM-DD-YYYY'.", ephemeral=True)
-            return
+        await ctx.send(f"Failed to fetch price for the ticker: {ticker}. Please try again.", ephemeral=True)
+        return
 
-    for stock in all_data:
-        if stock['Ticker'].lower() == ticker.lower():
-            array_found_in = "rsa" if stock in rsa_data else "past"
-
-            if split_ratio:
-                stock['Split Ratio'] = split_ratio
-                logging.info(f"Split ratio updated for RSA '{ticker}' to '{split_ratio}'. Requested by {ctx.member.display_name}.")
-            if date:
-                try:
-                    parsed_date = datetime.strptime(date, "%m-%d-%Y")
-                    formatted_date = parsed_date.strftime("%m-%d-%Y")
-                    stock['Date'] = formatted_date
-                    logging.info(f"Date updated for RSA '{ticker}' to '{formatted_date}'. Requested by {ctx.member.display_name}.")
-                except ValueError:
-                    await ctx.send("Invalid date format. Please use 'MM-DD-YYYY'.", ephemeral=True)
-                    return
-            if agent:
-                stock['Transfer Agent'] = agent
-                logging.info(f"Transfer Agent updated for RSA '{ticker}' to '{agent}'. Requested by {ctx.member.display_name}.")
-            if source:
-                stock['Source'] = source
-                logging.info(f"Source updated for RSA '{ticker}' to '{source}'. Requested by {ctx.member.display_name}.")
-            if comments:
-                stock['Comments'] = comments
-                logging.info(f"Comments updated for RSA '{ticker}' to '{comments}'. Requested by {ctx.member.display_name}.")
-            if tag:
-                stock['Tag'] = tag
-                logging.info(f"Status updated for RSA '{ticker}' to '{tag}'. Requested by {ctx.member.display_name}.")
-            price = get_current_price(ticker)
-            if price is not None:
-                price = round(price, 2)
-            else:
-                await ctx.send(f"Failed to fetch price for the ticker: {ticker}. Please try again.", ephemeral=True)
-                return
-                
-            split_ratio_num = float(stock['Split Ratio'].split(":")[1])
-            estimated_profit = round(price * split_ratio_num, 2)
-
-            stock['Current Price'] = price
-            stock['Estimated Profit'] = estimated_profit
-            logging.info(f"Price and estimated profit updated for RSA '{ticker}'. Requested by {ctx.member.display_name}.")
-            
-            if array_found_in == "rsa":
-                write_json_data("rsa", rsa_data)
-            else:
-                write_json_data("past", past_data)
+    # Look it up again, it may have been confirmed or deleted while we waited
+    array_found_in, stock = store.find_one(ticker, ("rsa", "past"))
+    if stock is None:
+        logging.warning(f"RSA '{ticker}' was deleted while it was being edited. Requested by {ctx.member.display_name}.")
+        await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
+        return
 
-            if not asyncio.get_event_loop().is_running():
-                asyncio.get_event_loop().create_task(update_stock_prices())
+    if split_ratio:
+        stock.split_ratio = split_ratio
+        logging.info(f"Split ratio updated for RSA '{ticker}' to '{split_ratio}'. Requested by {ctx.member.display_name}.")
+    if date:
+        stock.date = date
+        logging.info(f"Date updated for RSA '{ticker}' to '{date}'. Requested by {ctx.member.display_name}.")
+    if agent:
+        stock.transfer_agent = agent
+        logging.info(f"Transfer Agent updated for RSA '{ticker}' to '{agent}'. Requested by {ctx.member.display_name}.")
+    if source:
+        stock.source = source
+        logging.info(f"Source updated for RSA '{ticker}' to '{source}'. Requested by {ctx.member.display_name}.")
+    if comments:
+        stock.comments = comments
+        logging.info(f"Comments updated for RSA '{ticker}' to '{comments}'. Requested by {ctx.member.display_name}.")
+    if tag:
+        stock.tag = tag
+        logging.info(f"Status updated for RSA '{ticker}' to '{tag}'. Requested by {ctx.member.display_name}.")
 
-            await ctx.send(f"Stock '{ticker}' updated successfully.", ephemeral=True)
-            return
+    set_price(stock, price)
+    logging.info(f"Price and estimated profit updated for RSA '{ticker}'. Requested by {ctx.member.display_name}.")
+
+    store.touch(array_found_in, stock)
 
-    logging.warning(f"RSA '{ticker}' not found. Requested by {ctx.member.display_name}.")
-    await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
+    scheduler.wake()
+
+    await ctx.send(f"Stock '{ticker}' updated successfully.", ephemeral=True)
 
 
 # Brokers
@@ -622,27 +794,17 @@ async def edit_stock(ctx: SlashContext, ticker: str, split_ratio: str = None, da
 )
 async def brokers(ctx: SlashContext, ticker: str, broker: str, status: int):
     ticker = ticker.upper()
-    rsa_data = read_json_data("rsa")
-    past_data = read_json_data("past")
-    
     brokers_to_update = DAILY_BROKERS if broker == "DAILY" else [broker]
 
-    for data in [rsa_data, past_data]:
-        for stock in data:
-            if stock["Ticker"].upper() == ticker:
-                for broker_to_update in brokers_to_update:
-                    if broker_to_update not in stock["BrokerTracking"]:
-                        continue
-                    if stock["BrokerTracking"][broker_to_update] == status:
-                        status_text = "Available" if status == 1 else "Unavailable"
-                        continue
-                    stock["BrokerTracking"][broker_to_update] = status
-                write_json_data("rsa" if data is rsa_data else "past", data)
-                status_text = "available" if status == 1 else "unavailable"
-                await ctx.send(f"${ticker} is {status_text} to sell on {', '.join(brokers_to_update)}!\nThank you {ctx.member.display_name} for contributing, have a :cookie:", ephemeral=False)
-                return
+    found_in, stock = store.find_one(ticker, ("rsa", "past"))
+    if stock is None:
+        await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
+        return
 
-    await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
+    stock.set_available(DAILY_MASK if broker == "DAILY" else broker_mask(brokers_to_update), status)
+    store.touch(found_in, stock)
+    status_text = "available" if status == 1 else "unavailable"
+    await ctx.send(f"${ticker} is {status_text} to sell on {', '.join(brokers_to_update)}!\nThank you {ctx.member.display_name} for contributing, have a :cookie:", ephemeral=False)
 
 
 # Confirm RSA
@@ -667,21 +829,15 @@ async def brokers(ctx: SlashContext, ticker: str, broker: str, status: int):
 )
 async def confirm_stock(ctx: SlashContext, ticker: str, tag: str):
     try:
-        stock_data = read_json_data("rsa")
-        past_stock_data = read_json_data("past")
-        for i, stock in enumerate(stock_data):
-            if stock['Ticker'].lower() == ticker.lower():
-                removed_stock = stock_data.pop(i)
-                removed_stock["Tag"] = tag
-                past_stock_data.append(removed_stock)
-                write_json_data("rsa", stock_data)
-                write_json_data("past", past_stock_data)
-                if not asyncio.get_event_loop().is_running():
-                    asyncio.get_event_loop().create_task(update_stock_prices())
-
-                logging.info(f"RSA '{ticker}' has been confirmed '{tag}'. Requested by {ctx.member.display_name}.")
-                await ctx.send(f"RSA '{ticker}' has been confirmed '{tag}'.", ephemeral=True)
-                return
+        found_in, stock = store.find_one(ticker, ("rsa",))
+        if stock is not None:
+            stock.tag = tag
+            store.move(stock, "rsa", "past")
+            active_tickers_changed()
+
+            logging.info(f"RSA '{ticker}' has been confirmed '{tag}'. Requested by {ctx.member.display_name}.")
+            await ctx.send(f"RSA '{ticker}' has been confirmed '{tag}'.", ephemeral=True)
+            return
 
         logging.warning(f"RSA '{ticker}' not found. Requested by {ctx.member.display_name}.")
         await ctx.send(f"RSA '{ticker}' not found.", ephemeral=True)
@@ -706,25 +862,14 @@ async def confirm_stock(ctx: SlashContext, ticker: str, tag: str):
 )
 async def delete_stock(ctx: SlashContext, ticker: str):
     try:
-        stock_data = read_json_data("rsa")
-        past_stock_data = read_json_data("past")
-        research_stock_data = read_json_data("research")
         stock_found = False
-
-        def delete_stock_from_array(stock_array):
-            for i, stock in enumerate(stock_array):
-                if stock['Ticker'].lower() == ticker.lower():
-                    stock_array.pop(i)
-                    return True
-            return False
-
-        stock_found |= delete_stock_from_array(stock_data)
-        stock_found |= delete_stock_from_array(past_stock_data)
-        stock_found |= delete_stock_from_array(research_stock_data)
-
-        write_json_data("rsa", stock_data)
-        write_json_data("past", past_stock_data)
-        write_json_data("research", research_stock_data)
+        for key in ("rsa", "past", "research"):
+            found_in, stock = store.find_one(ticker, (key,))
+            if stock is not None:
+                store.remove(key, stock)
+                stock_found = True
+        if stock_found:
+            active_tickers_changed()
 
         if stock_found:
             logging.info(f"RSA '{ticker}' deleted successfully. Requested by {ctx.member.display_name}.")
@@ -738,4 +883,256 @@ async def delete_stock(ctx: SlashContext, ticker: str):
         await ctx.send(f"An error occurred while deleting RSA '{ticker}'. Please try again.", ephemeral=True)
 
 
-bot.start()
+# Ticker autocomplete, active plays ranked first
+async def complete_ticker(ctx: AutocompleteContext, keys):
+    await ctx.send(choices=ticker_index.complete(ctx.input_text, keys))
+
+@rsa_stock.autocomplete("ticker")
+async def rsa_stock_ticker(ctx: AutocompleteContext):
+    await complete_ticker(ctx, ("rsa", "past"))
+
+@edit_stock.autocomplete("ticker")
+async def edit_stock_ticker(ctx: AutocompleteContext):
+    await complete_ticker(ctx, ("rsa", "past"))
+
+@brokers.autocomplete("ticker")
+async def brokers_ticker(ctx: AutocompleteContext):
+    await complete_ticker(ctx, ("rsa", "past"))
+
+@confirm_stock.autocomplete("ticker")
+async def confirm_stock_ticker(ctx: AutocompleteContext):
+    await complete_ticker(ctx, ("rsa",))
+
+@delete_stock.autocomplete("ticker")
+async def delete_stock_ticker(ctx: AutocompleteContext):
+    await complete_ticker(ctx, ("rsa", "research", "past"))
+
+
+# Bulk import
+@slash_command(
+    name="import",
+    description="Add many RSAs from a CSV or JSON file",
+    options=[
+        {
+            "name": "file",
+            "description": "CSV or JSON with ticker, split_ratio, source and optional date, agent, comments",
+            "type": OptionType.ATTACHMENT,
+            "required": True
+        }
+    ]
+)
+async def import_stocks(ctx: SlashContext, file: Attachment):
+    if file.size > bulk.MAX_IMPORT_BYTES:
+        await ctx.send(f"Attachment is larger than {bulk.MAX_IMPORT_BYTES // 1024} KB.", ephemeral=True)
+        return
+
+    await acknowledge(ctx, ephemeral=True)
+    try:
+        plays = bulk.parse_import(file.filename, await bulk.download(file.url))
+    except ValueError as e:
+        await ctx.send(str(e), ephemeral=True)
+        return
+
+    plays, errors = bulk.validate_plays(plays, set(active_tickers()))
+    if not errors:
+        quotes, missing = await quote_cache.get_many([play['ticker'] for play in plays], priority=INTERACTIVE)
+        for play in plays:
+            price = tradier.quote_price(quotes.get(play['ticker']))
+            if price is None:
+                errors.append(f"Failed to fetch price for the ticker: {play['ticker']}.")
+            else:
+                play['price'] = round(price, 2)
+
+    if errors:
+        shown = "\n".join(errors[:IMPORT_ERRORS_SHOWN])
+        more = f"\n...and {len(errors) - IMPORT_ERRORS_SHOWN} more." if len(errors) > IMPORT_ERRORS_SHOWN else ""
+        logging.warning(f"Import of '{file.filename}' rejected with {len(errors)} problems. Requested by {ctx.member.display_name}.")
+        await ctx.send(f"Nothing was imported, fix these and try again:\n{shown}{more}", ephemeral=True)
+        return
+
+    updated = datetime.now().isoformat(timespec='seconds')
+    new_stocks = [
+        Stock(
+            ticker=play['ticker'],
+            current_price=play['price'],
+            split_ratio=play['split_ratio'],
+            date=play['date'],
+            estimated_profit=calculate_estimated_profit(play['price'], play['split_ratio']),
+            source=play['source'],
+            transfer_agent=play['agent'],
+            comments=play['comments'],
+            tag='pending',
+            price_updated=updated
+        )
+        for play in plays
+    ]
+    store.add_many("rsa", new_stocks)
+    active_tickers_changed()
+
+    logging.info(f"Imported {len(new_stocks)} RSAs from '{file.filename}'. Requested by {ctx.member.display_name}.")
+    await ctx.send(f"Imported {len(new_stocks)} RSAs: {', '.join('$' + stock.ticker for stock in new_stocks)}", ephemeral=True)
+
+
+# Export
+@slash_command(
+    name="export",
+    description="Download the RSA database",
+    options=[
+        {
+            "name": "section",
+            "description": "Which list to export",
+            "type": OptionType.STRING,
+            "required": False,
+            "choices": [
+                {"name": "All", "value": "all"},
+                {"name": "Active", "value": "rsa"},
+                {"name": "Past", "value": "past"},
+                {"name": "Research", "value": "research"}
+            ]
+        },
+        {
+            "name": "filetype",
+            "description": "File format",
+            "type": OptionType.STRING,
+            "required": False,
+            "choices": [
+                {"name": "JSON", "value": "json"},
+                {"name": "CSV", "value": "csv"}
+            ]
+        }
+    ]
+)
+async def export_stocks(ctx: SlashContext, section: str = "all", filetype: str = "json"):
+    await acknowledge(ctx, ephemeral=True)
+    keys = ("rsa", "past", "research") if section == "all" else (section,)
+    # Shallow copies, the lists may change while the file is written off the event loop;
+    # archived segments are read one at a time by the writer
+    lists = [(key, store.records(key)) for key in keys]
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as export_file:
+        await asyncio.to_thread(bulk.write_export, export_file, lists, filetype)
+        file_name = f"rsa-{section}-{date.today().isoformat()}.{filetype}"
+        await ctx.send(file=File(export_file, file_name=file_name), ephemeral=True)
+    logging.info(f"Exported {', '.join(keys)} as {filetype}. Requested by {ctx.member.display_name}.")
+
+
+# Stats
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds == float("inf"):
+        return "slow"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+# Percentiles are histogram bucket upper bounds
+def histogram_lines(name, label, errors=None):
+    lines = []
+    for labels, histogram in sorted(registry.histogram_series(name), key=lambda item: -item[1].count):
+        value = str(labels.get(label, '-'))
+        line = f"{value:<24}{histogram.count:>7}  p50 <={format_seconds(histogram.quantile(0.5)):>6}  p95 <={format_seconds(histogram.quantile(0.95)):>6}"
+        if errors and errors.get(value):
+            line += f"  {errors[value]} errors"
+        lines.append(line)
+    return lines
+
+def stats_text():
+    command_errors = {labels['command']: value for labels, value in registry.counter_series("rsa_command_errors_total")}
+    lines = ["Commands"]
+    lines += histogram_lines("rsa_command_seconds", "command", command_errors)
+
+    lines.append("\nTradier")
+    lines += histogram_lines("tradier_request_seconds", "endpoint")
+    failures = {}
+    for labels, value in registry.counter_series("tradier_requests_total"):
+        if not str(labels['status']).startswith("2"):
+            failures[labels['endpoint']] = failures.get(labels['endpoint'], 0) + value
+    if failures:
+        lines.append("Failed: " + ", ".join(f"{endpoint} {count}" for endpoint, count in failures.items()))
+    limits = tradier.limiter.stats()
+    lines.append(f"Limiter budget {limits['budget']:.0f}, {limits['waiting']} waiting, delayed {limits['delayed'][INTERACTIVE]} commands / {limits['delayed'][BACKGROUND]} background, {limits['shed']} shed")
+
+    lines.append("\nCaches")
+    for name, cache in (("quotes", quote_cache), ("companies", company_cache), ("renders", render_cache)):
+        lookups = cache.hits + cache.misses
+        rate = f"{cache.hits / lookups:.0%}" if lookups else "-"
+        lines.append(f"{name:<24}{rate:>7}  ({cache.hits}/{lookups})")
+    lines.append(f"{quote_cache.coalesced} quote lookups shared a fetch")
+
+    lines.append("\nStore")
+    load = registry.histogram_series("rsa_store_load_seconds")
+    if load:
+        lines.append(f"Load {format_seconds(load[0][1].sum / load[0][1].count)}")
+    lines += histogram_lines("rsa_store_write_seconds", "kind")
+    lines.append(", ".join(f"{labels['file']} {format_bytes(size)}" for labels, size in store_file_sizes()))
+    if archive is not None:
+        reads = sum(value for _, value in registry.counter_series("rsa_archive_segment_loads_total"))
+        lines.append(f"Archive {archive.count()} plays in {len(archive.counts)} segments, {len(archive.loaded)} loaded, {reads} reads")
+
+    status = scheduler.status()
+    lines.append("\nRefresh")
+    lines += histogram_lines("rsa_refresh_cycle_seconds", "session")
+    lines.append(f"{status['cycles']} cycles, last {format_seconds(status['last_duration'])} for {status['last_count']} tickers, {len(status['last_missing'])} missing")
+
+    stream = quote_stream.status()
+    if stream['running']:
+        last_event = datetime.fromtimestamp(stream['last_event']).strftime('%H:%M:%S') if stream['last_event'] else "-"
+        lines.append("\nStream")
+        lines.append(f"{'Connected' if stream['connected'] else 'Disconnected'}, {stream['symbols']} symbols, {stream['events']} events, {stream['reconnects']} reconnects, last event {last_event}")
+
+    watch = watchdog.status()
+    if watch['stalls']:
+        lines.append("\nLoop stalls")
+        for entry in watch['top']:
+            lines.append(f"{entry['stalls']}x worst {format_seconds(entry['worst'])} {entry['command']} at {entry['site']}")
+    return "\n".join(lines)
+
+@slash_command(
+    name="stats",
+    description="Bot latency, Tradier usage and cache stats",
+    default_member_permissions=Permissions.ADMINISTRATOR
+)
+async def stats(ctx: SlashContext):
+    text = stats_text()
+    if len(text) > 1990:
+        text = text[:1990]
+    await ctx.send(f"```{text}```", ephemeral=True)
+
+
+# Latency, a structured log line and loop stall attribution for every
+# command and button, wrapped once all of them are defined
+for command in [value for value in list(globals().values()) if isinstance(value, (SlashCommand, ComponentCommand))]:
+    command_name = str(command.name) if isinstance(command, SlashCommand) else command.callback.__name__
+    callback = registry.timed("rsa_command", command.callback, command=command_name)
+    command.callback = loopwatch.attribute(logsetup.logged(callback, command_name), command_name)
+
+
+async def main():
+    # SIGTERM (systemd, docker stop) shuts down like Ctrl+C, so the data below is flushed
+    running = asyncio.create_task(bot.astart())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, running.cancel)
+    try:
+        await running
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        logging.info("Received SIGTERM, shutting down.")
+    finally:
+        await quote_stream.stop()
+        await scheduler.stop()
+        await watchdog.stop()
+        await store.settle()
+        store.close()
+        company_cache.flush()
+        await tradier.close()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        log_listener.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, time as clock
+from zoneinfo import ZoneInfo
+from metrics import registry
+
+MARKET_TZ = ZoneInfo("America/New_York")
+
+registry.describe("rsa_refresh_cycle_seconds", "histogram", "Price refresh cycle duration by market session")
+registry.describe("rsa_refresh_tickers_total", "counter", "Tickers refreshed by the scheduler")
+registry.describe("rsa_refresh_missing_total", "counter", "Tickers the scheduler got no price for")
+SESSIONS = (
+    ("premarket", clock(4, 0), clock(9, 30)),
+    ("regular", clock(9, 30), clock(16, 0)),
+    ("afterhours", clock(16, 0), clock(20, 0))
+)
+
+# Seconds between refreshes of a ticker; None pauses refreshing for that session
+DEFAULT_INTERVALS = {
+    "premarket": {"hot": 120, "normal": 600},
+    "regular": {"hot": 30, "normal": 120},
+    "afterhours": {"hot": 300, "normal": 900},
+    "closed": None
+}
+
+# US equity session for a moment in time (exchange holidays are not tracked)
+def market_session(now=None):
+    now = now or datetime.now(MARKET_TZ)
+    if now.weekday() >= 5:
+        return "closed"
+    for name, start, end in SESSIONS:
+        if start <= now.time() < end:
+            return name
+    return "closed"
+
+def next_session_start(now=None):
+    now = now or datetime.now(MARKET_TZ)
+    opening = now.replace(hour=SESSIONS[0][1].hour, minute=SESSIONS[0][1].minute, second=0, microsecond=0)
+    if now >= opening:
+        opening += timedelta(days=1)
+    while opening.weekday() >= 5:
+        opening += timedelta(days=1)
+    return opening
+
+
+# Single price refresh loop; hot tickers (splitting today or tomorrow) poll tighter
+class RefreshScheduler:
+    def __init__(self, refresh, targets, intervals=None, idle_check=3600, min_delay=5):
+        self.refresh = refresh
+        self.targets = targets
+        self.intervals = intervals or DEFAULT_INTERVALS
+        self.idle_check = idle_check
+        self.min_delay = min_delay
+        self.refreshed = {}
+        self.wake_event = asyncio.Event()
+        self.task = None
+        self.session = None
+        self.cycles = 0
+        self.last_cycle = None
+        self.last_duration = None
+        self.last_count = 0
+        self.last_missing = []
+        self.next_run = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+            logging.info("Price refresh scheduler started.")
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    # New or changed tickers: run a cycle now instead of waiting out the sleep
+    def wake(self):
+        self.wake_event.set()
+
+    async def run(self):
+        while True:
+            try:
+                delay = await self.cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Price refresh cycle failed.")
+                delay = self.min_delay * 6
+            self.next_run = time.time() + delay
+            try:
+                await asyncio.wait_for(self.wake_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wake_event.clear()
+
+    async def cycle(self):
+        now_market = datetime.now(MARKET_TZ)
+        self.session = market_session(now_market)
+        intervals = self.intervals.get(self.session)
+
+        targets = self.targets()
+        for ticker in list(self.refreshed):
+            if ticker not in targets:
+                del self.refreshed[ticker]
+
+        # Outside configured sessions only tickers never priced since startup are fetched
+        now = time.monotonic()
+        if intervals is None:
+            due = [ticker for ticker in targets if ticker not in self.refreshed]
+        else:
+            due = [ticker for ticker, hot in targets.items() if now - self.refreshed.get(ticker, -math.inf) >= self.interval(intervals, hot)]
+        if due:
+            await self.refresh_due(due)
+
+        if intervals is None:
+            return max(self.min_delay, min((next_session_start(now_market) - now_market).total_seconds(), self.idle_check))
+        now = time.monotonic()
+        waits = [self.refreshed[ticker] + self.interval(intervals, hot) - now for ticker, hot in targets.items() if ticker in self.refreshed]
+        return max(self.min_delay, min(waits + [intervals["normal"]]))
+
+    async def refresh_due(self, due):
+        started = time.monotonic()
+        self.last_missing = await self.refresh(due) or []
+        finished = time.monotonic()
+        for ticker in due:
+            self.refreshed[ticker] = finished
+        self.cycles += 1
+        self.last_cycle = time.time()
+        self.last_duration = finished - started
+        self.last_count = len(due)
+        registry.observe("rsa_refresh_cycle_seconds", self.last_duration, session=self.session)
+        registry.increment("rsa_refresh_tickers_total", len(due))
+        registry.increment("rsa_refresh_missing_total", len(self.last_missing))
+        logging.info(f"Refreshed {len(due)} prices in {self.last_duration:.2f}s ({self.session} session, {len(self.last_missing)} missing).")
+
+    def interval(self, intervals, hot):
+        return intervals["hot" if hot else "normal"]
+
+    def status(self):
+        return {
+            'running': self.task is not None and not self.task.done(),
+            'session': self.session,
+            'cycles': self.cycles,
+            'last_cycle': self.last_cycle,
+            'last_duration': self.last_duration,
+            'last_count': self.last_count,
+            'last_missing': list(self.last_missing),
+            'next_run': self.next_run
+        }
@@ -0,0 +1,128 @@
+import bisect
+
+MAX_CHOICES = 25
+CHOICE_NAME_LIMIT = 100
+LIST_LABELS = {"rsa": "active", "research": "research", "past": "past"}
+
+# Ticker/company autocomplete. Each store list gets a sorted array of lower-cased
+# tickers and one of company-name suffixes starting at a word, so "corp" finds
+# "Acme Corp". Built once, then kept current from the store and company cache
+# hooks a ticker at a time; lookups are a bisect plus a short scan and never
+# leave memory.
+class PrefixIndex:
+    def __init__(self, store, company_cache, max_choices=MAX_CHOICES):
+        self.store = store
+        self.company_cache = company_cache
+        self.max_choices = max_choices
+        self.built = False
+        self.tickers = {}
+        self.names = {}
+        self.companies = {}
+        store.listeners.append(self.list_changed)
+        company_cache.listeners.append(self.company_changed)
+
+    def refresh(self):
+        if not self.built:
+            self.build()
+
+    def build(self):
+        self.companies = {}
+        for key in self.store.data:
+            self.build_list(key)
+        self.built = True
+
+    def build_list(self, key):
+        tickers = {(ticker or '').upper() for ticker in self.store.tickers_in(key)}
+        tickers.discard('')
+        self.tickers[key] = sorted((ticker.lower(), ticker) for ticker in tickers)
+        self.names[key] = []
+        for ticker in tickers:
+            self.insert_names(key, ticker, sort=False)
+        self.names[key].sort()
+
+    # Store hook: `ticker` may have joined or left list `key`
+    def list_changed(self, key, ticker):
+        if not self.built:
+            return
+        if ticker is None:
+            self.build_list(key)
+            return
+        if not ticker:
+            return
+        terms = self.tickers.setdefault(key, [])
+        index, indexed = locate(terms, (ticker.lower(), ticker))
+        present = self.store.has_ticker(key, ticker)
+        if present and not indexed:
+            terms.insert(index, (ticker.lower(), ticker))
+            self.insert_names(key, ticker)
+        elif indexed and not present:
+            del terms[index]
+            self.remove_names(key, ticker)
+
+    # Company cache hook: the ticker's name was added, replaced or dropped
+    def company_changed(self, ticker):
+        if not self.built:
+            return
+        keys = [key for key, terms in self.tickers.items() if locate(terms, (ticker.lower(), ticker))[1]]
+        for key in keys:
+            self.remove_names(key, ticker)
+        self.companies.pop(ticker, None)
+        for key in keys:
+            self.insert_names(key, ticker)
+
+    def insert_names(self, key, ticker, sort=True):
+        company = self.company_cache.peek(ticker)
+        if company is None or not company.get('description'):
+            return
+        self.companies[ticker] = company['description']
+        name = company['description'].lower()
+        names = self.names.setdefault(key, [])
+        for start in word_starts(name):
+            if sort:
+                bisect.insort(names, (name[start:], ticker))
+            else:
+                names.append((name[start:], ticker))
+
+    def remove_names(self, key, ticker):
+        description = self.companies.get(ticker)
+        if description is None:
+            return
+        name = description.lower()
+        names = self.names.get(key, [])
+        for start in word_starts(name):
+            index, found = locate(names, (name[start:], ticker))
+            if found:
+                del names[index]
+
+    # Lists in `keys` are ranked in that order, ticker matches before name matches
+    def complete(self, text, keys):
+        self.refresh()
+        prefix = (text or '').strip().lstrip('$').lower()
+        choices = []
+        seen = set()
+        for key in keys:
+            for terms in (self.tickers.get(key, []), self.names.get(key, [])):
+                index = bisect.bisect_left(terms, (prefix,))
+                while index < len(terms) and terms[index][0].startswith(prefix):
+                    ticker = terms[index][1]
+                    index += 1
+                    if ticker in seen:
+                        continue
+                    seen.add(ticker)
+                    choices.append({"name": self.label(ticker, key), "value": ticker})
+                    if len(choices) >= self.max_choices:
+                        return choices
+        return choices
+
+    def label(self, ticker, key):
+        company = self.companies.get(ticker)
+        name = f"${ticker} - {company}" if company else f"${ticker}"
+        suffix = f" ({LIST_LABELS.get(key, key)})"
+        return name[:CHOICE_NAME_LIMIT - len(suffix)] + suffix
+
+def word_starts(name):
+    return [index for index, char in enumerate(name) if char.isalnum() and (index == 0 or not name[index - 1].isalnum())]
+
+def locate(terms, term):
+    index = bisect.bisect_left(terms, term)
+    return index, index < len(terms) and terms[index] == term
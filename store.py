@@ -0,0 +1,884 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from models import Stock, tracking_layout
+from metrics import registry
+
+KEYS = ("rsa", "research", "past")
+DATE_FORMAT = "%m-%d-%Y"
+SEQUENCE_KEY = "_journal_seq"
+SNAPSHOT = "snapshot"
+ARCHIVE = "archive"
+
+registry.describe("rsa_store_load_seconds", "histogram", "Time to load and index the stock data")
+registry.describe("rsa_store_write_seconds", "histogram", "Time to write stock data by kind (journal, snapshot, full, archive, records)")
+registry.describe("rsa_store_write_errors_total", "counter", "Failed stock data writes")
+
+def ticker_key(record):
+    return (record.ticker or '').upper()
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value or '', DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+def blank_data():
+    return {key: [] for key in KEYS}
+
+def replace_file(path, text):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+# Backends load and save the stocks.json record layout; the store holds Stock objects
+def to_stocks(data):
+    return {key: [Stock.from_dict(record) for record in records] for key, records in data.items()}
+
+def to_records(data, keys):
+    return {key: [stock.to_dict() for stock in data[key]] for key in keys}
+
+# Plain stocks.json file
+class JsonBackend:
+    journaled = False
+    incremental = False
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError as e:
+            self.set_aside(self.path, e)
+            return None
+        data.pop(SEQUENCE_KEY, None)
+        return data
+
+    # Keep an unreadable file around instead of overwriting it with a blank template
+    def set_aside(self, path, reason):
+        corrupt_path = f"{path}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        os.replace(path, corrupt_path)
+        logging.error(f"{path} could not be read ({reason}), moved it to {corrupt_path}.")
+
+    def files(self):
+        return [self.path]
+
+    def prepare(self, data, keys):
+        return json.dumps(to_records(data, list(data)), separators=(',', ':'))
+
+    # Temp file + rename so a crash never leaves a half-written file behind
+    def write(self, payload):
+        with self.lock:
+            self.replace(payload)
+
+    def replace(self, payload):
+        replace_file(self.path, payload)
+
+    def close(self):
+        pass
+
+
+# stocks.json as a snapshot plus an append-only journal of changes since it.
+# Journal lines carry a sequence number and the snapshot records the last one
+# it includes, so a crash between writing a snapshot and truncating the
+# journal never replays a change twice.
+class JournalBackend(JsonBackend):
+    journaled = True
+
+    def __init__(self, path, journal_path, compact_after=500):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.compact_after = compact_after
+        self.sequence = 0
+        self.journal_entries = 0
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = None
+        except json.JSONDecodeError as e:
+            self.set_aside(self.path, e)
+            if os.path.exists(self.journal_path):
+                self.set_aside(self.journal_path, "snapshot unreadable")
+            return None
+        if data is not None:
+            self.sequence = data.pop(SEQUENCE_KEY, 0)
+        replayed = self.replay(data if data is not None else blank_data())
+        if data is None and not replayed:
+            return None
+        return data if data is not None else replayed
+
+    # Apply journal entries newer than the snapshot, cutting off a torn or corrupt tail
+    def replay(self, data):
+        try:
+            with open(self.journal_path, 'rb') as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return None
+        offset = 0
+        kept = 0
+        applied = 0
+        for line in lines:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete line")
+                entry = json.loads(line)
+                if entry['seq'] > self.sequence:
+                    apply_entry(data, entry)
+                    self.sequence = entry['seq']
+                    applied += 1
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                logging.warning(f"{self.journal_path} is corrupt at byte {offset} ({e}), dropping {len(lines) - kept} trailing entries.")
+                with open(self.journal_path, 'r+b') as file:
+                    file.truncate(offset)
+                break
+            offset += len(line)
+            kept += 1
+        self.journal_entries = kept
+        if applied:
+            logging.info(f"Replayed {applied} journal entries from {self.journal_path}.")
+        return data if applied else None
+
+    def files(self):
+        return [self.path, self.journal_path]
+
+    def prepare(self, data, keys):
+        records = to_records(data, list(data))
+        records[SEQUENCE_KEY] = self.sequence
+        return json.dumps(records, separators=(',', ':'))
+
+    # Snapshot first, then drop the entries it now contains
+    def write(self, payload):
+        with self.lock:
+            self.replace(payload)
+            with open(self.journal_path, 'w') as file:
+                os.fsync(file.fileno())
+            self.journal_entries = 0
+
+    def prepare_entries(self, entries):
+        lines = []
+        for entry in entries:
+            self.sequence += 1
+            entry = dict(entry, seq=self.sequence)
+            if 'record' in entry:
+                entry['record'] = entry['record'].to_dict()
+            if 'records' in entry:
+                entry['records'] = [stock.to_dict() for stock in entry['records']]
+            lines.append(json.dumps(entry, separators=(',', ':')) + "\n")
+        return "".join(lines), len(lines)
+
+    def append(self, payload):
+        lines, count = payload
+        with self.lock, open(self.journal_path, 'a') as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+            self.journal_entries += count
+
+    def should_compact(self):
+        return self.journal_entries >= self.compact_after
+
+
+# Journal entries address records by list position at the time of the change;
+# remove and put also carry the ticker so a mismatched replay is caught.
+def apply_entry(data, entry):
+    records = data.setdefault(entry['list'], [])
+    op = entry['op']
+    if op == "add":
+        records.append(entry['record'])
+    elif op == "extend":
+        records.extend(entry['records'])
+    elif op == "set":
+        data[entry['list']] = entry['records']
+    elif op in ("put", "remove"):
+        if records[entry['index']].get('Ticker') != entry['ticker']:
+            raise ValueError(f"expected '{entry['ticker']}' at {entry['list']}[{entry['index']}]")
+        if op == "put":
+            records[entry['index']] = entry['record']
+        else:
+            del records[entry['index']]
+    else:
+        raise ValueError(f"unknown op '{op}'")
+
+
+STOCK_COLUMNS = {
+    'Ticker': 'ticker',
+    'Current Price': 'current_price',
+    'Split Ratio': 'split_ratio',
+    'Date': 'date',
+    'Estimated Profit': 'estimated_profit',
+    'Source': 'source',
+    'Transfer Agent': 'transfer_agent',
+    'Comments': 'comments',
+    'Tag': 'tag'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stocks (
+    id INTEGER PRIMARY KEY,
+    list TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    ticker TEXT,
+    current_price,
+    split_ratio,
+    date,
+    split_date TEXT,
+    estimated_profit,
+    source,
+    transfer_agent,
+    comments,
+    tag,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stocks_list ON stocks(list, position);
+CREATE INDEX IF NOT EXISTS idx_stocks_ticker ON stocks(ticker COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_stocks_split_date ON stocks(split_date);
+CREATE INDEX IF NOT EXISTS idx_stocks_tag ON stocks(tag COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS broker_tracking (
+    stock_id INTEGER NOT NULL REFERENCES stocks(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    broker TEXT NOT NULL,
+    available,
+    PRIMARY KEY (stock_id, broker)
+);
+"""
+
+BROKER_FIELDS = ('Brokers', 'Tracked Brokers', 'BrokerTracking')
+
+# Broker rows for a record, none when it has no broker entries stored
+def stored_brokers(stock):
+    if 'BrokerTracking' in stock.absent and stock.is_default('BrokerTracking'):
+        return []
+    return list(stock.broker_tracking().items())
+
+# SQLite database in WAL mode, one row per record and one child row per broker.
+# A record keeps its row id while it is in the store, so a change to one play
+# is an UPDATE of its row and of the broker rows that changed.
+class SqliteBackend:
+    journaled = False
+    incremental = True
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        # id(Stock) -> row id; row id -> (list, position) and broker values as written
+        self.ids = {}
+        self.placement = {}
+        self.brokers = {}
+        self.next_position = {}
+        self.next_id = 1
+        self.loaded_rows = {}
+
+    def load(self):
+        with self.lock:
+            if self.conn.execute("SELECT COUNT(*) FROM stocks").fetchone()[0] == 0:
+                return None
+            data = blank_data()
+            records = {}
+            loaded_rows = {}
+            columns = ", ".join(STOCK_COLUMNS.values())
+            absent = []
+            for row in self.conn.execute(f"SELECT id, list, position, {columns}, extra FROM stocks ORDER BY list, position"):
+                record = dict(zip(STOCK_COLUMNS, row[3:-1]), BrokerTracking={})
+                extra = json.loads(row[-1]) if row[-1] else {}
+                absent.append((record, extra.pop('_absent', [])))
+                record.update(extra)
+                data.setdefault(row[1], []).append(record)
+                loaded_rows.setdefault(row[1], []).append((row[0], row[2]))
+                records[row[0]] = record
+            for stock_id, broker, available in self.conn.execute("SELECT stock_id, broker, available FROM broker_tracking ORDER BY stock_id, position"):
+                records[stock_id]['BrokerTracking'][broker] = available
+            for record, keys in absent:
+                for key in keys:
+                    del record[key]
+            self.loaded_rows = loaded_rows
+            self.next_id = max(records) + 1
+            return data
+
+    # Ties the store's Stock objects to the rows load() read them from
+    def bind(self, data):
+        self.ids = {}
+        self.placement = {}
+        self.brokers = {}
+        for key, stocks in data.items():
+            for stock, (row_id, position) in zip(stocks, self.loaded_rows.get(key, [])):
+                self.ids[id(stock)] = row_id
+                self.placement[row_id] = (key, position)
+                self.brokers[row_id] = dict(stored_brokers(stock))
+            self.next_position[key] = max((position for _, position in self.loaded_rows.get(key, [])), default=-1) + 1
+        self.loaded_rows = {}
+
+    def files(self):
+        return [self.path, f"{self.path}-wal"]
+
+    # Whole lists, for a new database or after a failed write
+    def prepare(self, data, keys):
+        for row_id, (key, _) in list(self.placement.items()):
+            if key in keys:
+                del self.placement[row_id]
+                del self.brokers[row_id]
+        self.ids = {stock_id: row_id for stock_id, row_id in self.ids.items() if row_id in self.placement}
+        rows = {}
+        for key in keys:
+            self.next_position[key] = 0
+            rows[key] = [self.insert_row(key, stock) for stock in data.get(key, [])]
+        return rows
+
+    def insert_row(self, key, stock):
+        row_id = self.next_id
+        self.next_id += 1
+        position = self.next_position.get(key, 0)
+        self.next_position[key] = position + 1
+        self.ids[id(stock)] = row_id
+        self.placement[row_id] = (key, position)
+        row, brokers = self.stock_row(key, position, stock)
+        self.brokers[row_id] = dict(brokers)
+        return row_id, row, brokers
+
+    # Operations for the records changed since the last write; `changes` maps
+    # id(Stock) to (list, Stock), with a list of None for a removed record
+    def prepare_changes(self, changes):
+        operations = []
+        for key, stock in changes.values():
+            row_id = self.ids.get(id(stock))
+            if key is None:
+                if row_id is not None:
+                    del self.ids[id(stock)]
+                    del self.placement[row_id]
+                    del self.brokers[row_id]
+                    operations.append(("delete", row_id))
+                continue
+            if row_id is None:
+                operations.append(("insert", *self.insert_row(key, stock)))
+                continue
+            placed, position = self.placement[row_id]
+            if placed != key:
+                position = self.next_position.get(key, 0)
+                self.next_position[key] = position + 1
+                self.placement[row_id] = (key, position)
+            row, brokers = self.stock_row(key, position, stock)
+            written = self.brokers[row_id]
+            tracking = dict(brokers)
+            changed = [(available, row_id, broker) for broker, available in brokers if broker in written and written[broker] != available]
+            added = [(row_id, index, broker, available) for index, (broker, available) in enumerate(brokers) if broker not in written]
+            removed = [(row_id, broker) for broker in written if broker not in tracking]
+            self.brokers[row_id] = tracking
+            operations.append(("update", row_id, row, changed, added, removed))
+        return operations
+
+    # Keys the record does not have are listed under `_absent` in extra, so
+    # load() returns the record as it was stored
+    def stock_row(self, key, position, stock):
+        record = stock.to_dict()
+        extra = {field: value for field, value in record.items() if field not in STOCK_COLUMNS and field not in BROKER_FIELDS}
+        brokers = stored_brokers(stock)
+        absent = [field for field in STOCK_COLUMNS if field not in record] + ([] if brokers else ['BrokerTracking'])
+        if absent:
+            extra['_absent'] = absent
+        values = [record.get(field) for field in STOCK_COLUMNS]
+        split_date = parse_date(record.get('Date'))
+        split_date = split_date.isoformat() if split_date else None
+        row = (key, position, *values, split_date, json.dumps(extra) if extra else None)
+        return row, brokers
+
+    def insert(self, row_id, stock, brokers):
+        columns = ", ".join(STOCK_COLUMNS.values())
+        placeholders = ", ".join("?" * (len(STOCK_COLUMNS) + 5))
+        self.conn.execute(f"INSERT INTO stocks (id, list, position, {columns}, split_date, extra) VALUES ({placeholders})", (row_id, *stock))
+        self.conn.executemany(
+            "INSERT INTO broker_tracking (stock_id, position, broker, available) VALUES (?, ?, ?, ?)",
+            [(row_id, position, broker, available) for position, (broker, available) in enumerate(brokers)]
+        )
+
+    def write(self, rows):
+        with self.lock, self.conn:
+            for key, stocks in rows.items():
+                self.conn.execute("DELETE FROM stocks WHERE list = ?", (key,))
+                for row_id, stock, brokers in stocks:
+                    self.insert(row_id, stock, brokers)
+
+    def apply(self, operations):
+        assignments = ", ".join(f"{column} = ?" for column in ["list", "position", *STOCK_COLUMNS.values(), "split_date", "extra"])
+        with self.lock, self.conn:
+            for operation in operations:
+                kind, row_id = operation[:2]
+                if kind == "delete":
+                    self.conn.execute("DELETE FROM stocks WHERE id = ?", (row_id,))
+                elif kind == "insert":
+                    self.insert(*operation[1:])
+                else:
+                    stock, changed, added, removed = operation[2:]
+                    self.conn.execute(f"UPDATE stocks SET {assignments} WHERE id = ?", (*stock, row_id))
+                    self.conn.executemany("UPDATE broker_tracking SET available = ? WHERE stock_id = ? AND broker = ?", changed)
+                    self.conn.executemany("INSERT INTO broker_tracking (stock_id, position, broker, available) VALUES (?, ?, ?, ?)", added)
+                    self.conn.executemany("DELETE FROM broker_tracking WHERE stock_id = ? AND broker = ?", removed)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# One-shot import of an existing stocks.json into SQLite
+def migrate_json_to_sqlite(source, backend):
+    data = source.load()
+    if data is None:
+        return False
+    stocks = to_stocks(data)
+    backend.write(backend.prepare(stocks, list(stocks)))
+    # Checked against the file as read, brokers compared in one layout
+    expected = blank_data()
+    expected.update((key, [tracking_layout(record) for record in records]) for key, records in data.items())
+    if (backend.load() or blank_data()) != expected:
+        raise ValueError(f"Migration of {source.path} did not round-trip.")
+    logging.info(f"Imported {source.path} into {backend.path}.")
+    return True
+
+
+def open_backend(kind, json_path, sqlite_path, journal_path=None, compact_after=500):
+    if journal_path is None:
+        json_backend = JsonBackend(json_path)
+    else:
+        json_backend = JournalBackend(json_path, journal_path, compact_after)
+    if kind == "sqlite":
+        backend = SqliteBackend(sqlite_path)
+        if backend.load() is None and os.path.exists(json_path):
+            migrate_json_to_sqlite(json_backend, backend)
+        return backend
+    if kind == "json":
+        return json_backend
+    raise ValueError(f"Unknown storage backend '{kind}'.")
+
+
+# In-memory copy of the stock data, written back lazily. With an archive the
+# past list lives there instead and is only read a segment at a time.
+# `retired` is an archive left from a run that had it turned on, its plays
+# go back into the past list on load.
+class DocumentStore:
+    def __init__(self, backend, flush_delay=2.0, archive=None, retired=None):
+        self.backend = backend
+        self.archive = archive
+        self.retired = retired
+        self.flush_delay = flush_delay
+        self.data = None
+        self.version = 0
+        self.price_epoch = 0
+        self.tickers = {}
+        self.dates = []
+        self.date_entries = {}
+        self.date_sequence = 0
+        self.dirty = set()
+        self.entries = []
+        self.changes = {}
+        self.streamed = {}
+        self.flush_task = None
+        # What flush_later has taken from `dirty` and is writing, so flush()
+        # can take it back; writes run one at a time under write_lock
+        self.in_flight = None
+        self.archiving = None
+        self.write_lock = threading.Lock()
+        # Called with (list, ticker) when a ticker may have joined or left a
+        # list, or (list, None) when the whole list was replaced
+        self.listeners = []
+
+    def load(self):
+        started = time.perf_counter()
+        data = self.backend.load()
+        if data is None:
+            self.reset()
+        else:
+            self.data = to_stocks(data)
+        for key in KEYS:
+            self.data.setdefault(key, [])
+        if data is not None and self.backend.incremental:
+            self.backend.bind(self.data)
+        sealed = False
+        if self.archive is not None:
+            self.archive.load()
+            if self.data["past"]:
+                # Archive first: a crash before the snapshot only repeats the move
+                self.archive.seal(self.data["past"])
+                self.data["past"] = []
+                sealed = True
+        restored = None
+        if self.archive is None and self.retired is not None:
+            self.retired.load()
+            restored = self.retired.unseal(self.data["past"])
+            self.data["past"].extend(restored)
+        self.build_index()
+        registry.observe("rsa_store_load_seconds", time.perf_counter() - started)
+        if sealed or restored is not None or self.backend.journaled and self.backend.journal_entries:
+            self.compact()
+        if restored is not None:
+            # Saved above, so a crash before this only repeats the move
+            self.retired.discard()
+            self.retired = None
+            logging.info(f"Moved {len(restored)} archived plays back into the past list.")
+
+    def reset(self):
+        self.data = blank_data()
+        self.backend.write(self.backend.prepare(self.data, KEYS))
+        logging.info("Blank JSON initialized.")
+
+    def archived(self, key):
+        return key == "past" and self.archive is not None
+
+    # In-memory lists only; use records(), count() or tickers_in() for one that may be archived
+    def get(self, key):
+        return self.data[key]
+
+    def set(self, key, records):
+        if self.archived(key):
+            raise ValueError("The past list is archived, change it record by record.")
+        for record in self.data[key]:
+            self.changed(None, record)
+        for record in records:
+            self.changed(key, record)
+        self.data[key] = records
+        self.build_index(key)
+        self.notify(key, None)
+        self.mark_dirty(key, {'op': "set", 'list': key, 'records': list(records)})
+
+    # Active plays sorted by split date, dates parsed once per change
+    def index_date(self, record):
+        split_date = parse_date(record.date)
+        if split_date is None:
+            logging.warning(f"RSA '{record.ticker}' has an invalid date '{record.date}', leaving it out of the bulletins.")
+            return
+        self.date_sequence += 1
+        entry = (split_date, self.date_sequence, record)
+        bisect.insort(self.dates, entry)
+        self.date_entries[id(record)] = entry
+
+    def unindex_date(self, record):
+        entry = self.date_entries.pop(id(record), None)
+        if entry is not None:
+            del self.dates[bisect.bisect_left(self.dates, entry[:2])]
+
+    def between(self, start=None, end=None):
+        low = 0 if start is None else bisect.bisect_left(self.dates, (start,))
+        high = len(self.dates) if end is None else bisect.bisect_left(self.dates, (end + timedelta(days=1),))
+        return [entry[2] for entry in self.dates[low:high]]
+
+    def on_date(self, day):
+        return self.between(day, day)
+
+    # Upper-cased ticker -> [(list, record)] across every list
+    def build_index(self, key=None):
+        keys = KEYS if key is None else (key,)
+        for ticker in list(self.tickers):
+            entries = [entry for entry in self.tickers[ticker] if entry[0] not in keys]
+            if entries:
+                self.tickers[ticker] = entries
+            else:
+                del self.tickers[ticker]
+        if "rsa" in keys:
+            self.dates = []
+            self.date_entries = {}
+        for key in keys:
+            for record in self.data[key]:
+                self.index_record(key, record)
+
+    def index_record(self, key, record):
+        self.tickers.setdefault(ticker_key(record), []).append((key, record))
+        if key == "rsa":
+            self.index_date(record)
+
+    def unindex_record(self, key, record):
+        if key == "rsa":
+            self.unindex_date(record)
+        ticker = ticker_key(record)
+        entries = [entry for entry in self.tickers.get(ticker, []) if entry[1] is not record]
+        if entries:
+            self.tickers[ticker] = entries
+        else:
+            self.tickers.pop(ticker, None)
+
+    # Matches in the order of keys, then list order
+    def find(self, ticker, keys=KEYS):
+        entries = self.tickers.get(ticker.upper(), [])
+        matches = []
+        for key in keys:
+            if self.archived(key):
+                matches.extend((key, record) for record in self.archive.find(ticker))
+            else:
+                matches.extend((key, record) for entry_key, record in entries if entry_key == key)
+        return matches
+
+    def find_one(self, ticker, keys=KEYS):
+        matches = self.find(ticker, keys)
+        return matches[0] if matches else (None, None)
+
+    # Every record in a list, for export; archived segments are read as it is iterated
+    def records(self, key):
+        if self.archived(key):
+            return self.archive.records()
+        return list(self.data[key])
+
+    def count(self, key):
+        return self.archive.count() if self.archived(key) else len(self.data[key])
+
+    def has_ticker(self, key, ticker):
+        if self.archived(key):
+            return ticker.upper() in self.archive.tickers
+        return any(entry_key == key for entry_key, _ in self.tickers.get(ticker.upper(), ()))
+
+    def notify(self, key, ticker):
+        for listener in self.listeners:
+            listener(key, ticker)
+
+    def tickers_in(self, key):
+        if self.archived(key):
+            return self.archive.ticker_list()
+        return [record.ticker for record in self.data[key]]
+
+    def add(self, key, record):
+        if self.archived(key):
+            self.archive.add(record)
+            self.notify(key, ticker_key(record))
+            self.mark_dirty(ARCHIVE)
+            return
+        self.data[key].append(record)
+        self.changed(key, record)
+        self.index_record(key, record)
+        self.notify(key, ticker_key(record))
+        self.mark_dirty(key, {'op': "add", 'list': key, 'record': record})
+
+    # Bulk import: one version bump and one journal entry for the whole batch
+    def add_many(self, key, records):
+        if self.archived(key):
+            for record in records:
+                self.archive.add(record)
+                self.notify(key, ticker_key(record))
+            self.mark_dirty(ARCHIVE)
+            return
+        self.data[key].extend(records)
+        for record in records:
+            self.changed(key, record)
+            self.index_record(key, record)
+            self.notify(key, ticker_key(record))
+        self.mark_dirty(key, {'op': "extend", 'list': key, 'records': list(records)})
+
+    def remove(self, key, record):
+        if self.archived(key):
+            if self.archive.remove(record):
+                self.notify(key, ticker_key(record))
+                self.mark_dirty(ARCHIVE)
+            return
+        index = self.position(key, record)
+        if index is None:
+            return
+        self.data[key].pop(index)
+        self.changed(None, record)
+        self.unindex_record(key, record)
+        self.notify(key, ticker_key(record))
+        self.mark_dirty(key, {'op': "remove", 'list': key, 'index': index, 'ticker': record.ticker})
+
+    def position(self, key, record):
+        for i, existing in enumerate(self.data[key]):
+            if existing is record:
+                return i
+        return None
+
+    def put_entry(self, key, record):
+        index = self.position(key, record)
+        if index is None:
+            return None
+        return {'op': "put", 'list': key, 'index': index, 'ticker': record.ticker, 'record': record}
+
+    def move(self, record, source, destination):
+        self.remove(source, record)
+        self.add(destination, record)
+
+    # Record edited in place; one that has since left the list is ignored
+    def touch(self, key, record):
+        if self.archived(key):
+            if self.archive.touch(record):
+                self.mark_dirty(ARCHIVE)
+            return
+        entry = self.put_entry(key, record)
+        if entry is None:
+            return
+        if key == "rsa":
+            self.unindex_date(record)
+            self.index_date(record)
+        self.changed(key, record)
+        self.mark_dirty(key, entry)
+
+    # Quote refresh landed; bumps the price epoch rather than the data version
+    def prices_updated(self, key, records):
+        self.price_epoch += 1
+        for record in records:
+            entry = self.put_entry(key, record)
+            if entry is not None:
+                self.changed(key, record)
+                self.journal(entry)
+        self.save_later(key)
+
+    # Streamed trades: the price changes in memory right away, the journal
+    # entry and the epoch bump wait for the next flush, once per record
+    def prices_streamed(self, key, records):
+        for record in records:
+            self.streamed[id(record)] = (key, record)
+        self.save_later(key)
+
+    def apply_streamed(self):
+        streamed, self.streamed = self.streamed, {}
+        by_key = {}
+        for key, record in streamed.values():
+            by_key.setdefault(key, []).append(record)
+        for key, records in by_key.items():
+            self.prices_updated(key, records)
+
+    def mark_dirty(self, key, entry=None):
+        self.version += 1
+        self.journal(entry)
+        self.save_later(key)
+
+    # Per-record backends write just these; the last change to a record wins
+    def changed(self, key, record):
+        if self.backend.incremental:
+            self.changes[id(record)] = (key, record)
+
+    def journal(self, entry):
+        if self.backend.journaled and entry is not None:
+            self.entries.append(entry)
+
+    def save_later(self, key):
+        self.dirty.add(key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = loop.create_task(self.flush_later())
+
+    # Backends' prepare* calls serialise on the event loop, so the writes
+    # handed to a thread only ever see a snapshot
+    async def flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        self.apply_streamed()
+        if not self.dirty:
+            return
+        keys = self.in_flight = self.dirty
+        self.dirty = set()
+        try:
+            # Before the journal, so a crash mid-confirm leaves a play in both lists rather than neither
+            if ARCHIVE in keys:
+                self.archiving = self.archive.prepare()
+                await asyncio.to_thread(self.timed_write, "archive", self.archive.write, self.archiving)
+                self.archive.evict()
+                self.archiving = None
+                keys.discard(ARCHIVE)
+            if self.backend.journaled:
+                if SNAPSHOT not in keys and self.entries:
+                    entries, self.entries = self.entries, []
+                    await asyncio.to_thread(self.timed_write, "journal", self.backend.append, self.backend.prepare_entries(entries))
+                if SNAPSHOT in keys or self.backend.should_compact():
+                    await asyncio.to_thread(self.timed_write, "snapshot", self.backend.write, self.snapshot())
+            elif self.backend.incremental:
+                if SNAPSHOT in keys:
+                    await asyncio.to_thread(self.timed_write, "snapshot", self.backend.write, self.snapshot())
+                elif self.changes:
+                    changes, self.changes = self.changes, {}
+                    await asyncio.to_thread(self.timed_write, "records", self.backend.apply, self.backend.prepare_changes(changes))
+            elif keys:
+                await asyncio.to_thread(self.timed_write, "full", self.backend.write, self.backend.prepare(self.data, keys))
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Failed to save stock data: {e}")
+            registry.increment("rsa_store_write_errors_total")
+            self.unsaved(keys, self.archiving)
+        finally:
+            self.in_flight = self.archiving = None
+        # Changes made while writing
+        if self.dirty:
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_later())
+
+    # Puts back what a failed or interrupted write had taken
+    def unsaved(self, keys, archived):
+        if archived is not None:
+            self.archive.unsaved(archived)
+        if self.backend.journaled or self.backend.incremental:
+            # The journal or database may now be missing changes, only a snapshot is safe
+            self.entries = []
+            self.changes = {}
+            self.dirty.add(SNAPSHOT)
+        self.dirty.update(keys)
+
+    # Journal entries taken so far are part of the snapshot
+    def snapshot(self):
+        self.entries = []
+        self.changes = {}
+        self.dirty.discard(SNAPSHOT)
+        return self.backend.prepare(self.data, KEYS)
+
+    def compact(self):
+        self.timed_write("snapshot", self.backend.write, self.snapshot())
+
+    def timed_write(self, kind, write, payload):
+        started = time.perf_counter()
+        with self.write_lock:
+            write(payload)
+        registry.observe("rsa_store_write_seconds", time.perf_counter() - started, kind=kind)
+
+    # Clean shutdown: write anything still pending. What flush_later was
+    # writing is taken back and written again here; its thread may still be
+    # running, write_lock keeps the two from overlapping. Call settle() first
+    # on the event loop so it has finished.
+    def flush(self):
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+            if self.in_flight is not None:
+                self.unsaved(self.in_flight, self.archiving)
+                self.in_flight = self.archiving = None
+        self.flush_task = None
+        self.apply_streamed()
+        if not self.dirty:
+            return
+        keys, self.dirty = self.dirty, set()
+        if ARCHIVE in keys:
+            self.timed_write("archive", self.archive.write, self.archive.prepare())
+            keys.discard(ARCHIVE)
+        if not keys:
+            return
+        if self.backend.journaled or self.backend.incremental and SNAPSHOT in keys:
+            self.compact()
+        elif self.backend.incremental:
+            changes, self.changes = self.changes, {}
+            self.timed_write("records", self.backend.apply, self.backend.prepare_changes(changes))
+        else:
+            self.timed_write("full", self.backend.write, self.backend.prepare(self.data, keys))
+
+    # Before close() on the event loop: a write already under way finishes, one
+    # still waiting out flush_delay is dropped and left to flush()
+    async def settle(self):
+        while self.flush_task is not None and not self.flush_task.done():
+            if self.in_flight is None:
+                self.flush_task.cancel()
+                break
+            await asyncio.wait([self.flush_task])
+
+    def close(self):
+        self.flush()
+        self.backend.close()
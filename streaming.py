@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import aiohttp
+import tradier
+
+STREAM_URL = "wss://ws.tradier.com/v1/markets/events"
+
+# Tradier market events over a websocket, pushed into on_event as dicts
+class QuoteStream:
+    def __init__(self, symbols, on_event, url=STREAM_URL, on_disconnect=None, max_backoff=60, stable_after=30):
+        self.symbols = symbols
+        self.on_event = on_event
+        self.on_disconnect = on_disconnect
+        self.url = url
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.changed = asyncio.Event()
+        self.task = None
+        self.connected = False
+        self.subscribed = set()
+        self.events = 0
+        self.reconnects = 0
+        self.last_event = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+            logging.info("Quote stream started.")
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def resubscribe(self):
+        self.changed.set()
+
+    # Symbols currently covered by the stream; everything else falls back to polling
+    def live_symbols(self):
+        return self.subscribed if self.connected else set()
+
+    async def run(self):
+        backoff = 1
+        while True:
+            if not self.current_symbols():
+                await self.changed.wait()
+                self.changed.clear()
+                continue
+            started = time.monotonic()
+            try:
+                await self.stream()
+                logging.warning("Quote stream closed by the server.")
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Quote stream disconnected: {e!r}")
+            # Anything else (the limiter shedding the session request, a bad
+            # response) also goes through the backoff rather than ending the task
+            except Exception:
+                logging.exception("Quote stream failed")
+            finally:
+                was_connected = self.connected
+                self.connected = False
+                self.subscribed = set()
+                if was_connected and self.on_disconnect is not None:
+                    self.on_disconnect()
+            if time.monotonic() - started >= self.stable_after:
+                backoff = 1
+            self.reconnects += 1
+            delay = backoff + random.uniform(0, backoff / 2)
+            logging.info(f"Reconnecting quote stream in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def current_symbols(self):
+        return sorted({symbol.upper() for symbol in self.symbols()})
+
+    async def stream(self):
+        session_id = await tradier.create_stream_session()
+        timeout = aiohttp.ClientTimeout(total=None, connect=tradier.CONNECT_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.ws_connect(self.url, heartbeat=30) as ws:
+                self.changed.clear()
+                await self.subscribe(ws, session_id)
+                self.connected = True
+                watcher = asyncio.get_running_loop().create_task(self.watch_symbols(ws, session_id))
+                watcher.add_done_callback(lambda task: self.close_on_failure(task, ws))
+                try:
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self.handle(message.data)
+                        elif message.type == aiohttp.WSMsgType.ERROR:
+                            raise ws.exception() or aiohttp.ClientError("Websocket error")
+                    if watcher.done() and not watcher.cancelled() and watcher.exception() is not None:
+                        raise watcher.exception()
+                finally:
+                    watcher.cancel()
+
+    # A failed resubscribe leaves the socket on stale symbols; drop it and reconnect
+    def close_on_failure(self, task, ws):
+        if not task.cancelled() and task.exception() is not None:
+            asyncio.get_running_loop().create_task(ws.close())
+
+    async def subscribe(self, ws, session_id):
+        symbols = self.current_symbols()
+        await ws.send_json({
+            "symbols": symbols,
+            "sessionid": session_id,
+            "filter": ["trade", "quote"],
+            "linebreak": True
+        })
+        self.subscribed = set(symbols)
+        logging.info(f"Quote stream subscribed to {len(symbols)} symbols.")
+
+    # Sending a new payload on the open socket replaces the subscription
+    async def watch_symbols(self, ws, session_id):
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            if set(self.current_symbols()) != self.subscribed:
+                await self.subscribe(ws, session_id)
+
+    def handle(self, data):
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Ignoring malformed stream event: {line[:200]}")
+                continue
+            self.events += 1
+            self.last_event = time.time()
+            # One bad event or record must not drop the connection
+            try:
+                self.on_event(event)
+            except Exception as e:
+                logging.warning(f"Could not apply stream event {event}: {e!r}")
+
+    def status(self):
+        return {
+            'running': self.task is not None and not self.task.done(),
+            'connected': self.connected,
+            'symbols': len(self.subscribed),
+            'events': self.events,
+            'reconnects': self.reconnects,
+            'last_event': self.last_event
+        }
@@ -0,0 +1,14 @@
+import secrets as stdlib_secrets
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(1, str(ROOT / "bench"))
+
+# Modules that talk to Tradier only need the names from secrets.py
+module = types.ModuleType("secrets")
+module.__dict__.update(stdlib_secrets.__dict__)
+module.TRADIER_API_KEY = "test"
+sys.modules["secrets"] = module
@@ -0,0 +1,112 @@
+import json
+import os
+
+from archive import Archive
+from models import Stock, DAILY_MASK
+
+def play(ticker, date, source):
+    return Stock(ticker=ticker, split_ratio="1:10", date=date, source=source, tag="ROUNDED")
+
+def stored(directory):
+    plays = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("past-"):
+            with open(os.path.join(directory, name)) as file:
+                plays += [(stock.ticker, stock.date, int(stock.is_available("Schwab"))) for stock in map(Stock.from_dict, json.load(file))]
+    return plays
+
+# XYZ split in 2023 and again in 2025; the segments holding both are unloaded
+# while a command still has the 2025 record
+def evicted_archive(tmp_path):
+    archive = Archive(str(tmp_path), max_loaded=1, pin_seconds=0)
+    archive.load()
+    archive.add(play("XYZ", "03-01-2023", "https://example.com/xyz-2023"))
+    archive.add(play("XYZ", "06-01-2025", "https://example.com/xyz-2025"))
+    archive.add(play("ABC", "01-01-2024", "https://example.com/abc"))
+    archive.write(archive.prepare())
+
+    held = archive.find("XYZ")[1]
+    archive.find("ABC")
+    archive.evict()
+    assert "2025-06" not in archive.loaded
+    return archive, held
+
+def test_touch_after_eviction_updates_the_held_play(tmp_path):
+    archive, held = evicted_archive(tmp_path)
+    held.set_available(DAILY_MASK, 1)
+    assert archive.touch(held)
+    archive.write(archive.prepare())
+    assert stored(tmp_path) == [("XYZ", "03-01-2023", 0), ("ABC", "01-01-2024", 0), ("XYZ", "06-01-2025", 1)]
+
+def test_remove_after_eviction_keeps_the_other_play(tmp_path):
+    archive, held = evicted_archive(tmp_path)
+    assert archive.remove(held)
+    archive.write(archive.prepare())
+    assert stored(tmp_path) == [("XYZ", "03-01-2023", 0), ("ABC", "01-01-2024", 0)]
+    assert [stock.date for stock in archive.find("XYZ")] == ["03-01-2023"]
+
+def test_touch_after_eviction_refuses_a_play_it_cannot_match(tmp_path):
+    archive, held = evicted_archive(tmp_path)
+    held.date = "03-01-2023"
+    assert not archive.touch(held)
+    assert not archive.remove(held)
+    archive.write(archive.prepare())
+    assert stored(tmp_path) == [("XYZ", "03-01-2023", 0), ("ABC", "01-01-2024", 0), ("XYZ", "06-01-2025", 0)]
+
+def sealed_directory(tmp_path):
+    from store import DocumentStore, JsonBackend
+    path = str(tmp_path / "stocks.json")
+    with open(path, "w") as file:
+        json.dump({"rsa": [], "research": [], "past": [play("OLD", "03-01-2023", "https://example.com/old").to_dict()]}, file)
+    store = DocumentStore(JsonBackend(path), archive=Archive(str(tmp_path / "archive")))
+    store.load()
+    assert store.count("past") == 1
+    store.close()
+    with open(path) as file:
+        assert json.load(file)["past"] == []
+
+def reopened(tmp_path, backend):
+    from archive import archive_exists
+    from store import DocumentStore
+    directory = str(tmp_path / "archive")
+    assert archive_exists(directory)
+    store = DocumentStore(backend, retired=Archive(directory))
+    store.load()
+    assert not archive_exists(directory)
+    return store
+
+def test_turning_the_archive_off_moves_past_plays_back(tmp_path):
+    from store import DocumentStore, JsonBackend
+    sealed_directory(tmp_path)
+    path = str(tmp_path / "stocks.json")
+    store = reopened(tmp_path, JsonBackend(path))
+    assert [stock.ticker for _, stock in store.find("OLD")] == ["OLD"]
+    store.close()
+    store = DocumentStore(JsonBackend(path))
+    store.load()
+    assert store.count("past") == 1
+
+def test_switching_to_sqlite_keeps_archived_plays(tmp_path):
+    from store import DocumentStore, open_backend
+    sealed_directory(tmp_path)
+    sqlite_path = str(tmp_path / "stocks.db")
+    store = reopened(tmp_path, open_backend("sqlite", str(tmp_path / "stocks.json"), sqlite_path))
+    assert store.count("past") == 1
+    store.close()
+    store = DocumentStore(open_backend("sqlite", str(tmp_path / "stocks.json"), sqlite_path))
+    store.load()
+    assert [stock.ticker for _, stock in store.find("OLD")] == ["OLD"]
+
+def test_an_interrupted_move_back_is_not_repeated(tmp_path):
+    from store import JsonBackend
+    sealed_directory(tmp_path)
+    path = str(tmp_path / "stocks.json")
+    retired = Archive(str(tmp_path / "archive"))
+    retired.load()
+    with open(path) as file:
+        data = json.load(file)
+    data["past"] = [stock.to_dict() for stock in retired.records()]
+    with open(path, "w") as file:
+        json.dump(data, file)
+    store = reopened(tmp_path, JsonBackend(path))
+    assert store.count("past") == 1
@@ -0,0 +1,14 @@
+import bulk
+
+def test_errors_name_the_file_line_or_item():
+    csv_text = 'Ticker,Split Ratio,Source,Date,Comments\nABC,1:10,https://example.com,01-01-2030,\nXYZ,10:1,https://example.com,01-01-2030,"two\nlines"\nQRS,1:5,,01-01-2030,\n'
+    plays = bulk.parse_import("plays.csv", csv_text.encode())
+    _, errors = bulk.validate_plays(plays, set())
+    assert errors == [
+        "Line 3 (XYZ): invalid split ratio, format should be like '1:10'.",
+        "Line 5 (QRS): missing source.",
+    ]
+
+    plays = bulk.parse_import("plays.json", b'[{"Ticker": "ABC", "Split Ratio": "1:10"}]')
+    _, errors = bulk.validate_plays(plays, set())
+    assert errors == ["Item 1 (ABC): missing source."]
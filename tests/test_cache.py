@@ -0,0 +1,84 @@
+import asyncio
+
+from cache import QuoteCache
+from ratelimit import RateLimiter, RateLimited, INTERACTIVE, BACKGROUND
+
+# Tradier stand-in behind the limiter; background calls wait for `release`
+def limited_fetch(limiter, release, calls):
+    async def fetch(symbols, priority=BACKGROUND):
+        calls.append((tuple(symbols), priority))
+        await limiter.acquire(priority)
+        if priority == BACKGROUND:
+            await release.wait()
+        return {symbol: {'symbol': symbol, 'last': 1.0} for symbol in symbols}, []
+    return fetch
+
+def test_commands_get_the_reserve_background_work_waits_for():
+    async def main():
+        limiter = RateLimiter(rate=10, per=60, background_reserve=20, background_max_wait=0.1, poll_interval=0.01)
+        await limiter.acquire(INTERACTIVE)
+        try:
+            await limiter.acquire(BACKGROUND)
+        except RateLimited:
+            pass
+        else:
+            raise AssertionError("background request was let into the reserve")
+        assert limiter.shed == 1
+        assert limiter.granted == {INTERACTIVE: 1, BACKGROUND: 0}
+    asyncio.run(main())
+
+def test_command_does_not_wait_on_a_held_background_fetch():
+    async def main():
+        # 15 tokens free: enough for commands, below the background reserve
+        limiter = RateLimiter(rate=15, per=60, background_reserve=20, background_max_wait=30, poll_interval=0.01)
+        release = asyncio.Event()
+        release.set()
+        calls = []
+        cache = QuoteCache(limited_fetch(limiter, release, calls))
+        refresh = asyncio.create_task(cache.get_many(["ABC", "XYZ"], priority=BACKGROUND))
+        await asyncio.sleep(0.02)
+        price = await asyncio.wait_for(cache.get_price("ABC", priority=INTERACTIVE), 1)
+        assert price == 1.0
+        assert calls == [(("ABC", "XYZ"), BACKGROUND), (("ABC",), INTERACTIVE)]
+        assert not refresh.done()
+        refresh.cancel()
+    asyncio.run(main())
+
+def test_lookups_at_the_same_priority_share_one_fetch():
+    async def main():
+        limiter = RateLimiter(rate=30, per=60, poll_interval=0.01)
+        release = asyncio.Event()
+        calls = []
+        cache = QuoteCache(limited_fetch(limiter, release, calls))
+        first = asyncio.create_task(cache.get_price("ABC", priority=BACKGROUND))
+        second = asyncio.create_task(cache.get_price("ABC"))
+        await asyncio.sleep(0.02)
+        release.set()
+        assert await first == await second == 1.0
+        assert len(calls) == 1
+        assert cache.coalesced == 1
+        assert await cache.get_price("ABC", priority=INTERACTIVE) == 1.0
+        assert len(calls) == 1
+    asyncio.run(main())
+
+def test_company_cache_saves_later_and_never_goes_back(tmp_path):
+    import json
+    from cache import CompanyCache
+    path = str(tmp_path / "companies.json")
+    companies = CompanyCache(path, save_delay=0.01)
+
+    async def main():
+        companies.put("ABC", {"description": "Abc Corp", "exchange": "Q"})
+        companies.save_later()
+        assert not (tmp_path / "companies.json").exists()
+        await asyncio.sleep(0.1)
+    asyncio.run(main())
+    with open(path) as file:
+        assert list(json.load(file)) == ["ABC"]
+
+    companies.put("XYZ", {"description": "Xyz Inc", "exchange": "N"})
+    companies.flush()
+    # A save taken before the flush and finishing after it is dropped
+    companies.write({}, companies.changes - 1)
+    with open(path) as file:
+        assert list(json.load(file)) == ["ABC", "XYZ"]
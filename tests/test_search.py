@@ -0,0 +1,37 @@
+import random
+
+from cache import CompanyCache
+from models import Stock
+from search import PrefixIndex
+from store import DocumentStore, JsonBackend
+
+def test_incremental_updates_match_a_full_rebuild(tmp_path):
+    store = DocumentStore(JsonBackend(str(tmp_path / "stocks.json")))
+    store.load()
+    companies = CompanyCache(str(tmp_path / "companies.json"))
+    index = PrefixIndex(store, companies)
+    index.refresh()
+
+    rng = random.Random(0)
+    tickers = ["ABC", "ABD", "XYZ", "ACME", "BRK", "ZZ"]
+    for _ in range(300):
+        ticker = rng.choice(tickers)
+        action = rng.random()
+        if action < 0.4:
+            store.add(rng.choice(["rsa", "past"]), Stock(ticker=ticker, split_ratio="1:10", date="01-01-2030"))
+        elif action < 0.7:
+            matches = store.find(ticker)
+            if matches:
+                key, stock = rng.choice(matches)
+                store.remove(key, stock)
+        elif action < 0.9:
+            companies.put(ticker, {"description": rng.choice(["Acme Corp", f"{ticker} Holdings Inc", "Big Co"]), "exchange": "Q"})
+        else:
+            companies.invalidate(ticker)
+
+    rebuilt = PrefixIndex(store, companies)
+    rebuilt.refresh()
+    assert index.tickers == rebuilt.tickers
+    assert index.names == rebuilt.names
+    for text in ["a", "ab", "corp", "hold", "z", ""]:
+        assert index.complete(text, ("rsa", "past")) == rebuilt.complete(text, ("rsa", "past"))
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+from models import Stock
+from store import DocumentStore, JournalBackend
+
+def journaled_store(tmp_path):
+    store = DocumentStore(JournalBackend(str(tmp_path / "stocks.json"), str(tmp_path / "stocks.journal")), flush_delay=0.01)
+    store.load()
+    return store
+
+def journal(tmp_path):
+    with open(tmp_path / "stocks.journal") as file:
+        return [json.loads(line) for line in file]
+
+def test_streamed_trades_are_journaled_once_per_flush(tmp_path):
+    store = journaled_store(tmp_path)
+    stock = Stock(ticker="ABC", split_ratio="1:10", date="01-01-2030")
+    store.add("rsa", stock)
+
+    async def main():
+        epoch = store.price_epoch
+        for price in range(100):
+            stock.current_price = price
+            store.prices_streamed("rsa", [stock])
+        assert store.price_epoch == epoch
+        await asyncio.sleep(0.1)
+        assert store.price_epoch == epoch + 1
+    asyncio.run(main())
+
+    entries = [entry for entry in journal(tmp_path) if entry['op'] == "put"]
+    assert len(entries) == 1
+    assert entries[0]['record']['Current Price'] == 99
+
+def test_streamed_trade_for_a_confirmed_play_is_not_journaled(tmp_path):
+    store = journaled_store(tmp_path)
+    stock = Stock(ticker="ABC", split_ratio="1:10", date="01-01-2030")
+    store.add("rsa", stock)
+
+    async def main():
+        store.prices_streamed("rsa", [stock])
+        store.move(stock, "rsa", "past")
+        await asyncio.sleep(0.1)
+    asyncio.run(main())
+
+    assert [entry['op'] for entry in journal(tmp_path)] == ["remove", "add"]
+
+def test_touch_after_delete_leaves_the_play_out(tmp_path):
+    store = journaled_store(tmp_path)
+    stock = Stock(ticker="ABC", split_ratio="1:10", date="01-01-2030")
+    store.add("rsa", stock)
+    store.remove("rsa", stock)
+    stock.split_ratio = "1:20"
+    store.touch("rsa", stock)
+    assert store.get("rsa") == []
+    assert store.between() == []
+    assert store.find("ABC") == []
+
+def test_migration_keeps_absent_keys_and_refuses_coerced_brokers(tmp_path):
+    from models import BROKERS
+    from store import JsonBackend, SqliteBackend, migrate_json_to_sqlite
+    data = {
+        "rsa": [
+            {"Ticker": "ABC", "Split Ratio": "1:10", "Date": "01-01-2030"},
+            {"Ticker": "XYZ", "Tag": "CIL", "BrokerTracking": {broker: 1 for broker in BROKERS}, "Note": "kept"},
+        ],
+        "research": [],
+        "past": [{"Ticker": "OLD", "BrokerTracking": {"Schwab": 1, "Closed Broker": 0}}],
+    }
+    (tmp_path / "stocks.json").write_text(json.dumps(data))
+    backend = SqliteBackend(str(tmp_path / "stocks.db"))
+    assert migrate_json_to_sqlite(JsonBackend(str(tmp_path / "stocks.json")), backend)
+    assert backend.load() == data
+
+    data["rsa"][1]["BrokerTracking"]["Schwab"] = 2
+    (tmp_path / "coerced.json").write_text(json.dumps(data))
+    try:
+        migrate_json_to_sqlite(JsonBackend(str(tmp_path / "coerced.json")), SqliteBackend(str(tmp_path / "coerced.db")))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("coerced broker value was not caught")
+
+def test_records_store_brokers_as_masks(tmp_path):
+    from models import BROKERS, DAILY_MASK
+    stock = Stock.from_dict({"Ticker": "ABC", "BrokerTracking": {broker: 0 for broker in BROKERS}})
+    stock.set_available(DAILY_MASK, 1)
+    record = stock.to_dict()
+    assert "BrokerTracking" not in record
+    assert Stock.from_dict(json.loads(json.dumps(record))).broker_tracking() == stock.broker_tracking()
+
+def archived_store(tmp_path):
+    from archive import Archive
+    store = DocumentStore(JournalBackend(str(tmp_path / "stocks.json"), str(tmp_path / "stocks.journal")), flush_delay=0.01, archive=Archive(str(tmp_path / "archive")))
+    store.load()
+    return store
+
+# Shutdown while the archive half of a confirm is being written
+def confirm_then_close(tmp_path, settle):
+    import time
+    store = archived_store(tmp_path)
+    stock = Stock(ticker="ABC", split_ratio="1:10", date="01-01-2030")
+    store.add("rsa", stock)
+    store.flush()
+    write = store.archive.write
+
+    def slow_write(payload):
+        time.sleep(0.2)
+        write(payload)
+    store.archive.write = slow_write
+
+    async def main():
+        store.move(stock, "rsa", "past")
+        while store.in_flight is None:
+            await asyncio.sleep(0.005)
+        if settle:
+            await store.settle()
+        store.close()
+    asyncio.run(main())
+
+    reloaded = archived_store(tmp_path)
+    return reloaded.find("ABC", ("rsa",)), reloaded.find("ABC", ("past",))
+
+def test_close_during_an_archive_write_keeps_the_confirm(tmp_path):
+    active, past = confirm_then_close(tmp_path, settle=False)
+    assert active == []
+    assert [stock.ticker for _, stock in past] == ["ABC"]
+
+def test_settle_waits_for_an_archive_write(tmp_path):
+    active, past = confirm_then_close(tmp_path, settle=True)
+    assert active == []
+    assert [stock.ticker for _, stock in past] == ["ABC"]
@@ -0,0 +1,90 @@
+import asyncio
+
+import tradier
+from fake_tradier import FakeTradier
+from ratelimit import RateLimited
+from streaming import QuoteStream
+
+async def until(condition, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def run_stream(test, symbols=("ABC",), on_event=None):
+    async def main():
+        fake = FakeTradier(latency=0, jitter=0, trade_interval=0.01)
+        await fake.start()
+        tradier.API_URL = fake.url
+        events = []
+        stream = QuoteStream(lambda: list(symbols), on_event or events.append, url=fake.stream_url, max_backoff=1)
+        stream.start()
+        try:
+            await test(fake, stream, events)
+        finally:
+            await stream.stop()
+            await tradier.close()
+            await fake.stop()
+    asyncio.run(main())
+
+def test_trades_arrive_and_resubscribe_replaces_symbols():
+    symbols = ["ABC"]
+
+    async def test(fake, stream, events):
+        await until(lambda: any(event["type"] == "trade" for event in events))
+        assert stream.live_symbols() == {"ABC"}
+        symbols.append("XYZ")
+        stream.resubscribe()
+        await until(lambda: fake.subscriptions[-1] == ["ABC", "XYZ"])
+        await until(lambda: any(event["symbol"] == "XYZ" for event in events))
+        assert stream.reconnects == 0
+    run_stream(test, symbols)
+
+def test_reconnects_after_the_server_drops_the_stream():
+    async def test(fake, stream, events):
+        await until(lambda: stream.connected)
+        await fake.disconnect()
+        await until(lambda: stream.reconnects == 1 and stream.connected)
+    run_stream(test)
+
+def test_rate_limited_session_request_backs_off_and_retries(monkeypatch):
+    create = tradier.create_stream_session
+    calls = []
+
+    async def limited():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RateLimited("background budget exhausted")
+        return await create()
+    monkeypatch.setattr(tradier, "create_stream_session", limited)
+
+    async def test(fake, stream, events):
+        await until(lambda: stream.connected)
+        assert stream.reconnects == 1
+    run_stream(test)
+
+def test_failing_event_handler_keeps_the_connection():
+    def on_event(event):
+        raise IndexError("list index out of range")
+
+    async def test(fake, stream, events):
+        await until(lambda: stream.events > 5)
+        assert stream.connected and stream.reconnects == 0
+    run_stream(test, on_event=on_event)
+
+def test_failed_resubscribe_drops_the_connection(monkeypatch):
+    symbols = ["ABC"]
+
+    async def test(fake, stream, events):
+        await until(lambda: stream.connected)
+        subscribe = stream.subscribe
+
+        async def failing(ws, session_id):
+            raise ConnectionResetError("Cannot write to closing transport")
+        stream.subscribe = failing
+        symbols.append("XYZ")
+        stream.resubscribe()
+        await until(lambda: stream.reconnects == 1)
+        stream.subscribe = subscribe
+        await until(lambda: stream.connected and stream.live_symbols() == {"ABC", "XYZ"})
+    run_stream(test, symbols)
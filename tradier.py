@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from secrets import TRADIER_API_KEY
+from ratelimit import RateLimiter, RateLimited, INTERACTIVE, BACKGROUND
+from metrics import registry
+from logsetup import log_payload
+
+API_URL = "https://api.tradier.com/v1"
+REQUEST_TIMEOUT = 10
+CONNECT_TIMEOUT = 5
+MAX_CONNECTIONS = 10
+MAX_CONCURRENT_REQUESTS = 8
+QUOTE_BATCH_SIZE = 100
+RATE_LIMIT = 120
+BACKGROUND_RESERVE = 20
+
+EXCH_CODES = {
+    'A': 'NYSE MKT',
+    'B': 'NASDAQ OMX BX',
+    'C': 'National Stock Exchange',
+    'D': 'FINRA ADF',
+    'E': 'Market Independent (Generated by Nasdaq SIP)',
+    'F': 'Mutual Funds/Money Markets (NASDAQ)',
+    'I': 'International Securities Exchange',
+    'J': 'Direct Edge A',
+    'K': 'Direct Edge X',
+    'L': 'Long Term Stock Exchange',
+    'M': 'Chicago Stock Exchange',
+    'N': 'NYSE',
+    'P': 'NYSE Arca',
+    'Q': 'NASDAQ OMX',
+    'S': 'NASDAQ Small Cap',
+    'T': 'NASDAQ Int',
+    'U': 'OTCBB',
+    'V': 'OTC other',
+    'W': 'CBOE',
+    'X': 'NASDAQ OMX PSX',
+    'G': 'GLOBEX',
+    'Y': 'BATS Y-Exchange',
+    'Z': 'BATS'
+}
+
+_session = None
+_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+limiter = RateLimiter(rate=RATE_LIMIT, per=60, background_reserve=BACKGROUND_RESERVE)
+registry.describe("tradier_request_seconds", "histogram", "Tradier request latency by endpoint")
+registry.describe("tradier_requests_total", "counter", "Tradier requests by endpoint and HTTP status or exception")
+
+# Shared keep-alive session, created on first use inside the running loop
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+        headers = {"Authorization": f"Bearer {TRADIER_API_KEY}", "Accept": "application/json"}
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
+    return _session
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+async def api_get(path, params=None, priority=BACKGROUND):
+    await limiter.acquire(priority)
+    async with _semaphore:
+        return await timed_request(path, get_session().get(f"{API_URL}{path}", params=params))
+
+# Session id for the market events stream, valid for a few minutes
+async def create_stream_session():
+    await limiter.acquire(BACKGROUND)
+    async with _semaphore:
+        data = await timed_request("/markets/events/session", get_session().post(f"{API_URL}/markets/events/session"))
+    return data['stream']['sessionid']
+
+# Per-endpoint latency and outcome: the HTTP status, or the exception name when there is none
+async def timed_request(path, request):
+    started = time.perf_counter()
+    status = "error"
+    try:
+        async with request as response:
+            status = response.status
+            limiter.update(response.headers, response.status)
+            response.raise_for_status()
+            return await response.json(content_type=None)
+    except Exception as e:
+        if status == "error":
+            status = type(e).__name__
+        raise
+    finally:
+        registry.observe("tradier_request_seconds", time.perf_counter() - started, endpoint=path)
+        registry.increment("tradier_requests_total", endpoint=path, status=status)
+
+# Batched price lookup
+async def get_current_prices(tickers, priority=BACKGROUND):
+    symbols = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    chunks = [symbols[start:start + QUOTE_BATCH_SIZE] for start in range(0, len(symbols), QUOTE_BATCH_SIZE)]
+    results = await asyncio.gather(*(api_get("/markets/quotes", {"symbols": ",".join(chunk)}, priority) for chunk in chunks), return_exceptions=True)
+
+    quotes = {}
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, (aiohttp.ClientError, asyncio.TimeoutError, ValueError, RateLimited)):
+            logging.error(f"Price lookup failed for {', '.join(chunk)}: {result!r}")
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        quotes.update(parse_quotes(result))
+
+    missing = [symbol for symbol in symbols if quote_price(quotes.get(symbol)) is None]
+    if missing:
+        logging.warning(f"Price not found for {', '.join(missing)}")
+    return quotes, missing
+
+# Tradier returns a dict for a single quote and a list for several
+def parse_quotes(data):
+    quote_data = (data or {}).get('quotes') or {}
+    quote_list = quote_data.get('quote') or []
+    if isinstance(quote_list, dict):
+        quote_list = [quote_list]
+    return {quote['symbol'].upper(): quote for quote in quote_list if quote.get('symbol')}
+
+def quote_price(quote):
+    if not quote:
+        return None
+    return quote.get('last')
+
+# Ticker lookup
+async def lookup_company(ticker, priority=INTERACTIVE):
+    try:
+        data = await api_get("/markets/lookup", {"q": ticker}, priority)
+        log_payload(f"Lookup response for {ticker}", data)
+
+        securities = data.get('securities')
+        if securities:
+            security_list = securities.get('security')
+            if isinstance(security_list, dict):
+                security_list = [security_list]
+            for security in security_list or []:
+                if security.get('symbol') == ticker:
+                    exchange_code = security.get('exchange', 'null')
+                    return {
+                        'description': security.get('description', 'null'),
+                        'exchange': EXCH_CODES.get(exchange_code, 'Unknown')
+                    }
+
+        logging.error("The response data did not contain the expected fields.")
+        raise KeyError("The response data did not contain the expected fields.")
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, RateLimited) as e:
+        logging.error(f"Company info not found for {ticker}. HTTP Request Exception: {e!r}")
+        return None
+
+    except (KeyError, ValueError) as e:
+        logging.error(f"The response data did not contain the expected fields: {e}")
+        return None
+
+def format_company(company):
+    if not company:
+        return 'null'
+    return f"({company['description']} @ {company['exchange']})"